@@ -0,0 +1,187 @@
+'''
+Benchmarks of the engine and renderer hot paths on synthetic boards
+Run with key=value arguments, for example: python benchmark.py sizes=16,64 out=bench.json baseline=old.json
+'''
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import gameboard
+import generator
+from gameboard import BoardLayout
+from general import Direction, GremmType, split_args
+from simulation import Simulation
+
+
+#board sizes (width and height in tiles) to benchmark at
+DEFAULT_SIZES = (16, 32, 64, 128)
+
+#shortest time to keep repeating a benchmark for
+MIN_TIME = 0.2
+
+#slowdown compared to a baseline that is reported as a regression
+REGRESSION = 0.2
+
+class BenchSimulation(Simulation):
+    '''
+    Simulation which stays in its room when a door is hit
+    '''
+
+    def exit_room(self, direction):
+        pass
+
+def random_gremlins(sim, count, seed=0, duplicates=0.0):
+    '''
+    Places gremlins on random empty tiles of a simulation's board
+    :param duplicates: fraction of gremlins put on the same tile as another one
+    '''
+    rng = random.Random(seed)
+    empty = [(x, y) for y in range(sim.max_y) for x in range(sim.max_x) if sim.board.tile(x, y).name == "EMPTY"]
+    gremlins = []
+    for _ in range(count):
+        if len(gremlins) > 0 and rng.random() < duplicates:
+            loc = rng.choice(gremlins)[0]
+        else:
+            loc = rng.choice(empty)
+        gremlins.append((loc, rng.choice(list(Direction)), GremmType.GOOD))
+    return gremlins
+
+def measure(func, min_time=MIN_TIME):
+    '''
+    Times a function, repeating it until enough time has passed, then measures its peak memory once
+    :param func: function with no arguments (one call is one operation)
+    :return: returns tuple (operations per second, peak memory in bytes)
+    '''
+    func() #warm up
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count / elapsed, peak
+
+def bench_forward(layout_path):
+    '''
+    Follows one gremlin from every empty tile with no memoized outcomes
+    '''
+    sim = BenchSimulation(BoardLayout(layout_path))
+    states = [(loc[0], loc[1], direction) for loc, direction, _ in random_gremlins(sim, 200)]
+    def run():
+        sim.revision += 1
+        for state in states:
+            sim.forward(state)
+    return run
+
+def bench_move(layout_path, count):
+    '''
+    Moves a crowd of gremlins once (outcomes memoized between runs like in a real game)
+    '''
+    sim = BenchSimulation(BoardLayout(layout_path))
+    gremlins = random_gremlins(sim, count)
+    def run():
+        sim.gremlins = gremlins
+        sim.move()
+    return run
+
+def bench_collision(layout_path, count):
+    '''
+    Detects collisions among a crowd of gremlins where a tenth share a tile
+    '''
+    sim = BenchSimulation(BoardLayout(layout_path))
+    gremlins = random_gremlins(sim, count, duplicates=0.1)
+    cells = bytearray(sim.board.cells)
+    def run():
+        sim.board.cells[:] = cells
+        sim.gremlins = gremlins
+        sim.collision_detect()
+    return run
+
+def bench_parse(layout_path):
+    '''
+    Parses a layout from text, skipping the layout cache
+    '''
+    def run():
+        gameboard.LAYOUT_CACHE.clear()
+        BoardLayout(layout_path)
+    return run
+
+def bench_render(layout_path, count, what):
+    '''
+    Draws the background or the gremlins of a board with SDL's dummy video driver
+    '''
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import gui
+    sim = BenchSimulation(BoardLayout(layout_path))
+    display = gui.GameBoard(sim.board, [])
+    gremlins = random_gremlins(sim, count)
+    if what == "background":
+        return lambda: display.make_background(sim.board)
+    return lambda: display.make_gremlins(gremlins)
+
+def run_all(sizes):
+    '''
+    Runs every benchmark at every size
+    :return: returns list of (name, size, operations per second, peak bytes) tuples
+    '''
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            layout_path = generator.write_layout(folder, "bench%d" % size, width=size, height=size, seed=0)
+            crowd = size * 4
+            benches = [
+                ("forward x200", bench_forward(layout_path)),
+                ("move %d gremlins" % crowd, bench_move(layout_path, crowd)),
+                ("collision_detect %d gremlins" % crowd, bench_collision(layout_path, crowd)),
+                ("parse layout", bench_parse(layout_path)),
+            ]
+            if size <= 64: #bigger windows than this are mostly measuring memory bandwidth
+                benches.extend([
+                    ("make_background", bench_render(layout_path, crowd, "background")),
+                    ("make_gremlins %d gremlins" % crowd, bench_render(layout_path, crowd, "gremlins")),
+                ])
+            for name, func in benches:
+                rate, peak = measure(func)
+                results.append((name, size, rate, peak))
+                print("%-32s %5dx%-5d %12.1f ops/s %10.1f KiB peak" % (name, size, size, rate, peak / 1024))
+                sys.stdout.flush()
+    return results
+
+def compare(results, baseline_file):
+    '''
+    Prints every benchmark which got slower than a saved baseline
+    :return: returns number of regressions
+    '''
+    with open(baseline_file) as fp:
+        baseline = {(name, size): rate for name, size, rate, _ in json.load(fp)}
+    regressions = 0
+    for name, size, rate, _ in results:
+        old_rate = baseline.get((name, size))
+        if old_rate is not None and rate < old_rate * (1 - REGRESSION):
+            regressions += 1
+            print("REGRESSION %s at %d: %.1f ops/s (was %.1f)" % (name, size, rate, old_rate))
+    return regressions
+
+def main():
+    kwargs, _ = split_args()
+    sizes = [int(size) for size in kwargs["sizes"].split(",")] if "sizes" in kwargs else DEFAULT_SIZES
+    results = run_all(sizes)
+    if "out" in kwargs:
+        with open(kwargs["out"], "w") as fp:
+            json.dump(results, fp, indent=1)
+    if "baseline" in kwargs and compare(results, kwargs["baseline"]) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,32 +2,53 @@
 Central engine of the game - converts user inputs into game changes
 '''
 
-from pygame import QUIT, KEYDOWN, K_UP, K_LEFT, K_RIGHT, KMOD_CTRL, K_c, K_SPACE
+from pygame import QUIT, KEYDOWN, K_UP, K_LEFT, K_RIGHT, KMOD_CTRL, K_c, K_SPACE, K_F3, K_BACKSPACE, K_r
 from pygame.key import get_mods
+from pygame.time import Clock, get_ticks
 
-from gui import GameBoard, WHITE, BLACK
 from gameboard import BoardLayout
-from general import Tile, GremmType, Direction, clock
+from gui import GameBoard, WHITE, BLACK
+from simulation import Simulation
+from replay import Recorder
+from profiler import Profiler
+from general import Action, is_true
+
 
+#most frames drawn per second
+DEFAULT_FPS = 60
 
-MAX_RECURSION = 20
+#keys which go back to an earlier state (also allowed after losing)
+RESTORE_KEYS = {
+    K_SPACE : Action.RESTART,
+    K_BACKSPACE : Action.UNDO,
+    K_r : Action.RESET,
+}
 
-class Engine():
+class Engine(Simulation):
     '''
     Engine controls game logic and passes it to the gui
     '''
     
-    def __init__(self, layout_file, display_message=True):
+    def __init__(self, layout_file, display_message=True, fps=DEFAULT_FPS, idle=True, record=None, profile=None, compiled=False):
         '''
         Begins the game with specific parameters
-        '''
-        self.total_moves = 0
-        self.level_moves = 0
+        :param fps: most frames to draw per second
+        :param idle: if True, sleeps until the player does something instead of polling every frame
+        :param record: name of log file to append every action to (see replay module) or None
+        :param profile: name of .json or .csv file to write frame timings to on exit (F3 shows them) or None
+        :param compiled: if True, loads the layout from (and saves) a compiled copy next to it
+        '''
+        self.fps = fps
+        self.idle = idle
+        self.clock = Clock()
         self.playing = not display_message
+        self.display = None
+        self.recorder = Recorder(record, layout_file) if record is not None else None
+        self.profiler = Profiler(profile) if profile is not None else None
+        self.show_profile = False
         
         self.layout_file = layout_file
-        self.layout = BoardLayout(layout_file)
-        self.init_board()
+        Simulation.__init__(self, BoardLayout(layout_file, compiled), undo=True)
         
         if not self.playing:
             self.start_msg()
@@ -38,221 +59,152 @@ class Engine():
         '''
         Displays win message and stops accepting user input for playing other than x button
         '''
+        Simulation.win(self)
         self.playing = False
         self.display.update_message("You Win - Das Ende", WHITE, BLACK)
     
+    def lose(self):
+        '''
+        Displays lose message and stops accepting moves until the game is restarted
+        '''
+        Simulation.lose(self)
+        self.playing = False
+        self.display.update_message("You Lose - Spacebar to restart", WHITE, BLACK)
+    
     def start_msg(self):
         '''
         Displays start message until spacebar
         '''
         self.display.update_message("Arrow keys to move, Spacebar to (re)start", BLACK, WHITE)
     
-    def init_board(self, direction=Direction.UP, current_name=None):
+    def room_changed(self):
         '''
-        Initializes next board from the layout object and updates object accordingly
-        :param direction: direction to go out of room
-        :param current_name: name of current room (to go to next room) or None to get first room
+        Shows the newly loaded room
         '''
-        won = False
-        new_direction = direction
-        if current_name is not None:
-            next_map = self.layout.next_map(current_name, direction)
-            if next_map is None:
-                won = True
-            else:
-                self.board_name, self.board, new_direction = next_map
-        else:
-            self.board_name, self.board = self.layout.get_start()
-        
         alt_color = self.layout.color(self.board_name)
-        self.max_y = len(self.board)
-        self.max_x = max([len(row) for row in self.board])
-        
-        self.gremlins = self.first_gremlin(new_direction)
-        self.display = GameBoard(self.board, self.gremlins, alt_color=alt_color)
-        
-        if won:
-            self.win()
+        if self.display is None:
+            self.display = GameBoard(self.board, self.gremlins, alt_color=alt_color)
+            self.display.profiler = self.profiler
+        else:
+            self.display.load_board(self.board, self.gremlins, alt_color)
     
-    def loop(self):
+    def gremlins_changed(self):
         '''
-        Basic loop tests pygame key events and reacts accordingly
+        Shows the gremlins after they change
         '''
-        done = False
-        while not done:
-            for event in self.display.loop():
-                if event.type == QUIT:
-                    done = True
-                if event.type == KEYDOWN:
-                    if self.playing:
-                        if event.key == K_SPACE:
-                            self.__init__(self.layout_file, False)
-                            done = True
-                        if event.key == K_UP:
-                            self.move()
-                        if event.key == K_LEFT:
-                            self.rotate(1)
-                        if event.key == K_RIGHT:
-                            self.rotate(-1)
-                        if event.key == K_c and (get_mods() & KMOD_CTRL):
-                            done = True
-                    elif event.key == K_SPACE:
-                        self.display.clear_message()
-                        self.playing = True
-                self.collision_detect()
+        self.display.update_gremlins(self.gremlins)
     
-    def first_gremlin(self, direction=Direction.UP):
+    def board_changed(self, cells):
         '''
-        Finds the first gremlin in a map based on the door patterns
-        :param direction: direction to go into map (not side to start on)
-        :return: returns a list of one gremlin ((x,y),direction,type)
+        Shows the board after its tiles change
         '''
-        if direction in (Direction.UP, Direction.DOWN):
-            row = (len(self.board) - 1) if direction is Direction.UP else 0
-            for i in range(len(self.board[row])):
-                if self.board[row][i] is Tile.DOOR:
-                    return [((i, row), direction, GremmType.GOOD)]
-        
-        if direction in (Direction.LEFT, Direction.RIGHT):
-            col = (max([len(row) for row in self.board])) - 1 if direction is Direction.LEFT else 0
-            for i in range(len(self.board)):
-                if self.board[i][col] is Tile.DOOR:
-                    return [((col, i), direction, GremmType.GOOD)]
-        
-        print("Error: no first door detected")
-        return []
+        self.display.update_background(self.board, cells)
     
-    def move(self):
+    def restored(self):
         '''
-        Moves gremlins straight (and then some)
+        Goes back to playing after a restart, undo or room reset (even from a loss)
         '''
-        new_gremlins = []
-        for gremlin in self.gremlins:
-            moved = self.forward(gremlin, 0)
-            if len(moved) > 0:
-                new_gremlins.extend(moved)
-            else:
-                #A door was hit so it's inside another loop
-                return False
-#         
-        self.gremlins = new_gremlins
-        self.display.update_gremlins(self.gremlins)
-        
-        self.total_moves += 1
-        self.level_moves += 1
-        
-        return True
+        if not (self.won or self.lost):
+            if not self.playing:
+                self.display.clear_message()
+            self.playing = True
     
-    def forward(self, gremlin, count=0):
+    def forward_searched(self, depth, states):
         '''
-        Moves the gremlin forward in the map, while also applying any subsequent actions
-        :param gremlin: gremlin tuple to move forward
-        :param count: number of times it was recursed to prevent exceeding MAX_RECURSION
-        :return: returns the gremlin moved to a new place
+        Counts searches of the gremlin state graph if profiling
         '''
-        direction = gremlin[1]
-        
-        dx, dy = (0, 0)
-        if direction is Direction.UP: dx, dy = (0, -1)
-        elif direction is Direction.RIGHT: dx, dy = (1, 0)
-        elif direction is Direction.DOWN: dx, dy = (0, 1)
-        elif direction is Direction.LEFT: dx, dy = (-1, 0)
-        x, y = gremlin[0]
-        
-        new_loc = new_x, new_y = (x+dx, y+dy)
-        
-        self.total_moves += 1
-        self.level_moves += 1
-        
-        if not (0 <= new_x < self.max_x) or not (0 <= new_y < self.max_y):
-            #out of bounds -> turn around
-            return self.forward((new_loc, clock(direction, 2), gremlin[2]), count+1)
-        
-        try:
-            next_tile = self.board[new_y][new_x]
-            if next_tile is Tile.OCCUPIED:
-                #occupied so turn around
-                return self.forward((new_loc, clock(direction, 2), gremlin[2]), count+1)
-        
-            #four cases of hitting mirrors
-            elif next_tile in (Tile.FW_SLASH, Tile.BK_SLASH):
-                if count < MAX_RECURSION:
-                    if next_tile is Tile.FW_SLASH and direction in (Direction.UP, Direction.RIGHT):
-                        up = self.forward((new_loc, Direction.UP, gremlin[2]), count+1)
-                        right = self.forward((new_loc, Direction.RIGHT, gremlin[2]), count+1)
-                        return up + right
-                    
-                    elif next_tile is Tile.FW_SLASH and direction in (Direction.DOWN, Direction.LEFT):
-                        down = self.forward((new_loc, Direction.DOWN, gremlin[2]), count+1)
-                        left = self.forward((new_loc, Direction.LEFT, gremlin[2]), count+1)
-                        return down + left
-                    
-                    elif next_tile is Tile.BK_SLASH and direction in (Direction.DOWN, Direction.RIGHT):
-                        down = self.forward((new_loc, Direction.DOWN, gremlin[2]), count+1)
-                        right = self.forward((new_loc, Direction.RIGHT, gremlin[2]), count+1)
-                        return down + right
-                    
-                    elif next_tile is Tile.BK_SLASH and direction in (Direction.UP, Direction.LEFT):
-                        up = self.forward((new_loc, Direction.UP, gremlin[2]), count+1)
-                        left = self.forward((new_loc, Direction.LEFT, gremlin[2]), count+1)
-                        return up + left
-                else:
-                    #TODO TODO TODO lose error
-                    return []
-            elif next_tile is Tile.DOOR:
-                #a door yay!
-                door_direction = self.which_door(new_loc)
-                self.init_board(door_direction, self.board_name)
-                return []
-            else:
-                return [(new_loc, direction, gremlin[2])]
-        except RecursionError:
-            return []
+        if self.profiler is not None:
+            self.profiler.searched(depth, states)
     
-    def rotate(self, direction):
+    def move(self):
         '''
-        Rotates the gremlins 90 degrees
-        :param direction: if positive or zero, rotates counter clockwise; clockwise else
+        Moves gremlins, timing it if profiling
         '''
-        new_gremlins = []
-        for gremlin in self.gremlins:
-            new_dir = clock(gremlin[1], (1 if direction >= 0 else -1))
-            new_gremlins.append((gremlin[0], new_dir, gremlin[2]))
-        self.gremlins = new_gremlins
-        self.display.update_gremlins(self.gremlins)
-        
+        if self.profiler is None:
+            return Simulation.move(self)
+        self.profiler.mark("events")
+        result = Simulation.move(self)
+        self.profiler.mark("forward")
+        return result
+    
     def collision_detect(self):
         '''
-        Detects collisions and turns any collisions to OCCUPIED tiles in the board
+        Detects collisions, timing it if profiling
         '''
-        locations = [gremlin[0] for gremlin in self.gremlins]
-        collision = False
-        for gremlin in self.gremlins:
-            loc = gremlin[0]
-            if locations.count(loc) > 1:
-                collision = True
-                self.board[loc[1]][loc[0]] = Tile.OCCUPIED
-                self.gremlins = list(filter(lambda grem: grem[0] != loc, self.gremlins))
-        
-        if collision:
-            self.display.update_background(self.board)
-            self.display.update_gremlins(self.gremlins)
+        if self.profiler is None:
+            return Simulation.collision_detect(self)
+        self.profiler.mark("events")
+        result = Simulation.collision_detect(self)
+        self.profiler.mark("collision")
+        return result
     
-    def which_door(self, loc):
+    def play(self, action):
         '''
-        Determines which door is at a location
-        :param loc: integer x,y tuple at edge of board
-        :return: returns a direction enum for which way the gremlin would be going if it went directly out the door
+        Records (if recording) and applies an action from the player
+        :param action: Action enum
         '''
-        x,y = loc
-        if x == 0: return Direction.LEFT
-        elif x == self.max_x-1: return Direction.RIGHT
-        elif y == 0: return Direction.UP
-        elif y == self.max_y-1: return Direction.DOWN
-        #if the place isn't a door, that's a persnal problem
+        if self.recorder is not None:
+            self.recorder.record(get_ticks(), self.board_name, action)
+        self.act(action)
+    
+    def loop(self):
+        '''
+        Basic loop tests pygame key events and reacts accordingly
+        '''
+        done = False
+        profiler = self.profiler
+        while not done:
+            if profiler is not None:
+                profiler.begin_frame()
+            
+            #only redraw when something changed, and no more than fps times a second
+            if self.display.render() or not self.idle:
+                self.clock.tick(self.fps)
+            
+            if profiler is not None:
+                profiler.mark("sleep")
+            events = self.display.loop(wait=self.idle)
+            if profiler is not None:
+                profiler.mark("wait")
+            
+            for event in events:
+                if event.type == QUIT:
+                    done = True
+                if event.type == KEYDOWN:
+                    if event.key == K_F3 and profiler is not None:
+                        self.show_profile = not self.show_profile
+                        if not self.show_profile:
+                            self.display.update_overlay(None)
+                    if event.key in RESTORE_KEYS and (self.playing or self.lost):
+                        self.play(RESTORE_KEYS[event.key])
+                    elif self.playing:
+                        if event.key == K_UP:
+                            self.play(Action.MOVE)
+                        if event.key == K_LEFT:
+                            self.play(Action.LEFT)
+                        if event.key == K_RIGHT:
+                            self.play(Action.RIGHT)
+                        if event.key == K_c and (get_mods() & KMOD_CTRL):
+                            done = True
+                    elif event.key == K_SPACE:
+                        self.display.clear_message()
+                        self.playing = True
+            
+            if profiler is not None:
+                profiler.end_frame()
+                if self.show_profile and len(events) > 0:
+                    self.display.update_overlay(profiler.summary(self.total_moves, self.level_moves))
+        
+        if self.recorder is not None:
+            self.recorder.close(self)
+        if profiler is not None:
+            profiler.dump()
 
-def begin(layout_file="gbd1/gbd1.layout"):
-    Engine(layout_file)
+def begin(layout_file="gbd1/gbd1.layout", fps=DEFAULT_FPS, idle=True, record=None, profile=None, compiled=False):
+    '''
+    Starts the game (arguments may be strings from the command line)
+    '''
+    Engine(layout_file, fps=int(fps), idle=is_true(idle), record=record, profile=profile, compiled=is_true(compiled))
 
 if __name__ == "__main__":
     begin()
\ No newline at end of file
@@ -0,0 +1,139 @@
+'''
+Renders game states to PNG frames without a display, for documentation figures and animations
+Run with a log recorded by the game, for example: python export.py game.log frames workers=4
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join as pathjoin
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #must be set before pygame starts
+import pygame
+
+from gameboard import PackedBoard
+from general import split_args
+from gui import GameBoard
+from replay import read_log, new_game
+
+
+#renderer of the current worker process
+RENDERER = None
+
+class FrameRenderer():
+    '''
+    Draws states onto one reused frame surface, only repainting the background when the board changes
+    '''
+
+    def __init__(self):
+        self.display = None
+        self.frame = None
+        self.gremlin_surface = None
+        self.background_key = None
+
+    def render(self, state):
+        '''
+        Draws a state
+        :param state: tuple as given by capture
+        :return: returns pygame.Surface of the frame (reused by the next call)
+        '''
+        alt_color, width, height, cells, gremlins = state
+        key = (alt_color, width, height, cells)
+        if key != self.background_key:
+            board = PackedBoard(width, height, bytearray(cells))
+            if self.display is None:
+                self.display = GameBoard(board, alt_color=alt_color)
+            else:
+                self.display.load_board(board, alt_color=alt_color)
+            self.background_key = key
+
+        display = self.display
+        if self.frame is None or self.frame.get_size() != (display.max_x, display.max_y):
+            self.frame = pygame.Surface((display.max_x, display.max_y))
+        self.gremlin_surface = display.make_gremlins(gremlins, self.gremlin_surface)
+        self.frame.blit(display.layers["background"], (0, 0))
+        self.frame.blit(self.gremlin_surface, (0, 0))
+        return self.frame
+
+def capture(sim):
+    '''
+    Copies what is needed to draw a simulation as it is now
+    :param sim: Simulation object
+    :return: returns tuple (room color, width, height, board bytes, gremlins) which can be pickled
+    '''
+    alt_color = sim.layout.color(sim.board_name)
+    return (tuple(alt_color) if alt_color is not None else None, sim.board.width, sim.board.height,
+            bytes(sim.board.cells), tuple(sim.gremlins))
+
+def replay_states(layout_file, actions):
+    '''
+    Plays a recorded session headless, capturing the state before the first action and after each one
+    :param layout_file: name of .layout file in the assets folder
+    :param actions: list of (tick, room, Action) as read by replay.read_log
+    :return: returns list of states as given by capture
+    '''
+    sim = new_game(layout_file)
+    states = [capture(sim)]
+    for _, _, action in actions:
+        sim.act(action)
+        states.append(capture(sim))
+    return states
+
+def start_worker():
+    '''
+    Sets up the renderer of a worker process
+    '''
+    global RENDERER
+    RENDERER = FrameRenderer()
+
+def render_chunk(chunk):
+    '''
+    Renders consecutive states in a worker (consecutive so the background is usually unchanged)
+    :param chunk: list of (state, filename) tuples
+    :return: returns number of frames written
+    '''
+    for state, filename in chunk:
+        pygame.image.save(RENDERER.render(state), filename)
+    return len(chunk)
+
+def export_states(states, folder, workers=None, prefix="frame"):
+    '''
+    Renders states to numbered PNG files in a folder, splitting them between worker processes
+    :param states: list of states as given by capture
+    :param folder: folder to write in (created if missing)
+    :param workers: number of processes or None for one per core
+    :return: returns list of filenames in order
+    '''
+    os.makedirs(folder, exist_ok=True)
+    digits = len(str(max(len(states) - 1, 0)))
+    filenames = [pathjoin(folder, "%s%0*d.png" % (prefix, digits, index)) for index in range(len(states))]
+    jobs = list(zip(states, filenames))
+
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    size = max(1, -(-len(jobs) // workers))
+    chunks = [jobs[start:start+size] for start in range(0, len(jobs), size)]
+    if workers == 1:
+        start_worker()
+        for chunk in chunks:
+            render_chunk(chunk)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=start_worker) as pool:
+            list(pool.map(render_chunk, chunks))
+    return filenames
+
+def main():
+    '''
+    Exports every session of a log to frames in a folder (one subfolder per session if there are several)
+    '''
+    kwargs, args = split_args()
+    log_file = args[0]
+    folder = args[1] if len(args) > 1 else "frames"
+    workers = int(kwargs["workers"]) if "workers" in kwargs else None
+
+    sessions = read_log(log_file)
+    for index, (layout_file, actions, _) in enumerate(sessions):
+        session_folder = folder if len(sessions) == 1 else pathjoin(folder, "session%d" % index)
+        filenames = export_states(replay_states(layout_file, actions), session_folder, workers)
+        print("%s: %d frames" % (session_folder, len(filenames)))
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@ Generates and converts gameboard types
 '''
 
 from os.path import join as pathjoin
+import mmap
+import os
+import pickle
 import string
 
 from general import Tile, Direction, PROJECT_ROOT
-from collections import OrderedDict
+from collections import OrderedDict, deque
 
 
 #Which text character maps to which Tile enum in map file
@@ -19,6 +22,20 @@ text_mapping = {
     ':' : Tile.DOOR,
 }
 
+#flattened text_mapping so each character is a single lookup
+char_mapping = {char : tile for chars, tile in text_mapping.items() for char in chars}
+
+#bytes.translate table from map file bytes to PackedBoard bytes (0 for characters which aren't tiles)
+byte_mapping = bytearray(256)
+for char, tile in char_mapping.items():
+    byte_mapping[ord(char)] = tile.value
+byte_mapping = bytes(byte_mapping)
+
+#Tile enum for each byte value of a PackedBoard
+tile_codes = [None] * (max(tile.value for tile in Tile) + 1)
+for tile in Tile:
+    tile_codes[tile.value] = tile
+
 #which letter maps to which direction in layout file
 direction_mapping = {
     'N' : Direction.UP,
@@ -27,46 +44,43 @@ direction_mapping = {
     'W' : Direction.LEFT,
 }
 
+#parsed layouts by absolute path, reused as long as none of their files change
+LAYOUT_CACHE = {}
+
+#bumped whenever parse_layout results change so old compiled layouts are ignored
+LAYOUT_FORMAT = 4
+
+#extension of compiled layouts saved next to their .layout file
+COMPILED_EXTENSION = ".pickle"
+
 class BoardLayout():
     '''
     Reads from .layout file and controls flow between rooms
     '''
     
-    def __init__(self, filename):
+    def __init__(self, filename, compiled=False):
         '''
         Reads .layout file from assets folder and constructs BoardLayout object
+        Parsed layouts are cached for the whole process, so maps must be treated as read-only
+        :param filename: name of .layout file relative to the assets folder
+        :param compiled: if True, also keeps a compiled copy next to the .layout file
+            so other processes can skip parsing
         '''
-        self.maps = {}
-        self.colors = {}
-        self.layout = OrderedDict()
-        self.start = None
+        parsed = load_layout(pathjoin(PROJECT_ROOT, "assets", filename), compiled)
+        self.maps = parsed["maps"]
+        self.colors = parsed["colors"]
+        self.layout = parsed["layout"]
+        self.start = parsed["start"]
+        self.doors = parsed["doors"]
         
-        with open(pathjoin(PROJECT_ROOT, "assets", filename), "r") as fp:
-            for line in fp:
-                stripped = line.lstrip()
-                if len(stripped) > 0:
-                    key, value = [item.strip() for item in stripped.split(" ", 1)]
-                    if line == stripped:
-                        #no whitespace on side
-                        assert key != "END", "END is not a valid map key"
-                        filename, color_str = value.split(" ", 1)
-                        self.maps[key] = board_from_text_file(filename)
-                        self.colors[key] = [int(c) for c in color_str.split(",", 2)]
-                        self.layout[key] = {}
-                        
-                        if self.start is None:
-                            self.start = (key, self.maps[key])
-                            
-                    elif len(self.layout) > 0:
-                        #append direction to layout
-                        direction = direction_mapping[key]
-                        last_key = list(self.layout.keys())[-1]
-                        self.layout[last_key][direction] = value if value != "END" else "END"
-        
-        for mapping in self.layout.values():
-            for value in mapping.values():
-                assert value == "END" or value in self.maps.keys(), "Invalid mapping %s" % (value)
-                
+        graph = parsed["graph"]
+        self.transitions = graph["transitions"]
+        self.distance_to_end = graph["distance_to_end"]
+        self.exit_to_end = graph["exit_to_end"]
+        self.reachable = graph["reachable"]
+        self.dead_rooms = graph["dead_rooms"]
+        self.completable = self.start[0] in self.distance_to_end
+    
     def __str__(self):
         '''
         toString()
@@ -104,8 +118,338 @@ class BoardLayout():
         '''
         return self.colors.get(map_name)
     
+    def path_to_end(self, map_name):
+        '''
+        Gets the shortest way through the rooms from one room to END
+        :param map_name: name of room to start from
+        :return: returns list of (map name, direction) doors to go through or None if END can't be reached
+        '''
+        if map_name not in self.distance_to_end:
+            return None
+        path = []
+        while map_name != "END":
+            direction = self.exit_to_end[map_name]
+            path.append((map_name, direction))
+            map_name = self.transitions[map_name][direction]
+        return path
+    
     #TODO all of the stuff for board layout
 
+class PackedBoard():
+    '''
+    Compact board with one byte (the Tile value) per tile, stored row after row in a bytearray
+    Can be read and written like a 2D array (board[y][x]) but hot paths should index
+    cells[y*width + x] directly
+    '''
+    
+    def __init__(self, width, height, cells=None):
+        '''
+        Creates board of a given size, filled with EMPTY tiles unless cells are given
+        '''
+        self.width = width
+        self.height = height
+        self.cells = cells if cells is not None else bytearray([Tile.EMPTY.value]) * (width * height)
+        assert len(self.cells) == width * height, "Wrong number of cells for board size"
+    
+    @classmethod
+    def from_rows(cls, rows):
+        '''
+        Packs a 2D array of Tile enums (short rows are padded with EMPTY tiles)
+        '''
+        width = max([len(row) for row in rows]) if len(rows) > 0 else 0
+        board = cls(width, len(rows))
+        for y, row in enumerate(rows):
+            start = y * width
+            board.cells[start:start+len(row)] = bytes(tile.value for tile in row)
+        return board
+    
+    def copy(self):
+        '''
+        Copies the board (a single bytearray copy)
+        '''
+        return PackedBoard(self.width, self.height, bytearray(self.cells))
+    
+    def tile(self, x, y):
+        '''
+        Gets the Tile enum at a location
+        '''
+        return tile_codes[self.cells[y*self.width + x]]
+    
+    def set_tile(self, x, y, tile):
+        '''
+        Sets the Tile enum at a location
+        '''
+        self.cells[y*self.width + x] = tile.value
+    
+    def rows(self):
+        '''
+        Unpacks the board into a 2D array of Tile enums
+        '''
+        return [list(row) for row in self]
+    
+    def __len__(self):
+        return self.height
+    
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if not 0 <= y < self.height:
+            raise IndexError("board row out of range")
+        return PackedRow(self, y)
+    
+    def __iter__(self):
+        return (PackedRow(self, y) for y in range(self.height))
+    
+    def __repr__(self):
+        return "PackedBoard(%dx%d)" % (self.width, self.height)
+    
+    def __eq__(self, other):
+        return isinstance(other, PackedBoard) and (self.width, self.height, self.cells) == (other.width, other.height, other.cells)
+
+class PackedRow():
+    '''
+    View of a single row of a PackedBoard which reads and writes Tile enums
+    '''
+    
+    def __init__(self, board, y):
+        self.cells = board.cells
+        self.width = board.width
+        self.start = y * board.width
+    
+    def __len__(self):
+        return self.width
+    
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError("board column out of range")
+        return tile_codes[self.cells[self.start + x]]
+    
+    def __setitem__(self, x, tile):
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError("board column out of range")
+        self.cells[self.start + x] = tile.value
+    
+    def __iter__(self):
+        return (tile_codes[code] for code in self.cells[self.start:self.start+self.width])
+
+def parse_layout(path):
+    '''
+    Parses a .layout file and every map it uses
+    :param path: absolute path of .layout file
+    :return: returns dict with maps, colors, layout and start of a BoardLayout
+        and files, a list of every file read
+    '''
+    maps = {}
+    colors = {}
+    layout = OrderedDict()
+    start = None
+    files = [path]
+    
+    with open(path, "r") as fp:
+        for line in fp:
+            stripped = line.lstrip()
+            if len(stripped) > 0:
+                key, value = [item.strip() for item in stripped.split(" ", 1)]
+                if line == stripped:
+                    #no whitespace on side
+                    assert key != "END", "END is not a valid map key"
+                    filename, color_str = value.split(" ", 1)
+                    maps[key] = packed_board_from_file(filename)
+                    colors[key] = [int(c) for c in color_str.split(",", 2)]
+                    layout[key] = {}
+                    files.append(pathjoin(PROJECT_ROOT, "assets", filename))
+                    
+                    if start is None:
+                        start = (key, maps[key])
+                        
+                elif len(layout) > 0:
+                    #append direction to layout
+                    direction = direction_mapping[key]
+                    last_key = list(layout.keys())[-1]
+                    layout[last_key][direction] = value if value != "END" else "END"
+    
+    for mapping in layout.values():
+        for value in mapping.values():
+            assert value == "END" or value in maps.keys(), "Invalid mapping %s" % (value)
+    
+    doors = {name : door_index(board) for name, board in maps.items()}
+    graph = transition_graph(doors, layout, start[0])
+    return {"maps": maps, "colors": colors, "layout": layout, "start": start, "doors": doors,
+            "graph": graph, "files": files, "format": LAYOUT_FORMAT}
+
+def door_index(board):
+    '''
+    Indexes the doors of a board so entering and leaving a room are single lookups
+    Only the edges are looked at, so big rooms cost no more than their outline
+    :param board: PackedBoard or 2D array of Tile enums
+    :return: returns dict with
+        entries - Direction enum a gremlin comes in going to the (x,y) door it starts on
+            (the first door along the opposite edge)
+        exits - (x,y) of each door on an edge to the Direction enum a gremlin leaves going
+    '''
+    max_y = len(board)
+    max_x = max([len(row) for row in board]) if isinstance(board, list) else board.width
+    entries = {}
+    exits = {}
+    for y in range(max_y):
+        row = board[y]
+        if y == 0 or y == max_y-1:
+            columns = range(len(row))
+        else:
+            columns = (0, max_x-1) if len(row) == max_x else (0,)
+        for x in columns:
+            if row[x] is Tile.DOOR:
+                if x == 0: exits[(x, y)] = Direction.LEFT
+                elif x == max_x-1: exits[(x, y)] = Direction.RIGHT
+                elif y == 0: exits[(x, y)] = Direction.UP
+                elif y == max_y-1: exits[(x, y)] = Direction.DOWN
+    
+    #scan order matches the edges a gremlin comes in through
+    for x, tile in enumerate(board[max_y-1]):
+        if tile is Tile.DOOR:
+            entries.setdefault(Direction.UP, (x, max_y-1))
+    for x, tile in enumerate(board[0]):
+        if tile is Tile.DOOR:
+            entries.setdefault(Direction.DOWN, (x, 0))
+    for y, row in enumerate(board):
+        if len(row) == max_x and row[max_x-1] is Tile.DOOR:
+            entries.setdefault(Direction.LEFT, (max_x-1, y))
+        if row[0] is Tile.DOOR:
+            entries.setdefault(Direction.RIGHT, (0, y))
+    
+    return {"entries": entries, "exits": exits}
+
+def transition_graph(doors, layout, start_name):
+    '''
+    Compiles the graph of which room each door leads to and how the rooms reach END
+    :param doors: dict of map name to door_index of its board
+    :param layout: dict of map name to dict of Direction enum to map name or "END"
+    :param start_name: name of the starting map (where unmapped doors lead)
+    :return: returns dict with
+        transitions - map name to dict of door Direction to next map name or "END"
+        distance_to_end - map name to fewest doors to go through to reach END (missing if it can't)
+        exit_to_end - map name to the door Direction on a shortest way to END
+        reachable - set of map names which can be reached from the start
+        dead_rooms - set of reachable map names which can't reach END
+    '''
+    transitions = {}
+    for name, index in doors.items():
+        transitions[name] = {direction : layout[name].get(direction, start_name)
+                             for direction in sorted(set(index["exits"].values()))}
+    
+    reachable = {start_name}
+    queue = deque([start_name])
+    while queue:
+        name = queue.popleft()
+        for next_name in transitions[name].values():
+            if next_name != "END" and next_name not in reachable:
+                reachable.add(next_name)
+                queue.append(next_name)
+    
+    entering = {name : [] for name in doors}
+    entering["END"] = []
+    for name, room_doors in transitions.items():
+        for direction, next_name in room_doors.items():
+            entering[next_name].append((name, direction))
+    
+    distance_to_end = {"END": 0}
+    exit_to_end = {}
+    queue = deque(["END"])
+    while queue:
+        next_name = queue.popleft()
+        for name, direction in entering[next_name]:
+            if name not in distance_to_end:
+                distance_to_end[name] = distance_to_end[next_name] + 1
+                exit_to_end[name] = direction
+                queue.append(name)
+    del distance_to_end["END"]
+    
+    dead_rooms = {name for name in reachable if name not in distance_to_end}
+    return {"transitions": transitions, "distance_to_end": distance_to_end, "exit_to_end": exit_to_end,
+            "reachable": reachable, "dead_rooms": dead_rooms}
+
+def file_times(files):
+    '''
+    Gets modification times of files to tell whether a cached layout is stale
+    :return: returns tuple of integer nanosecond times or None if a file is missing
+    '''
+    try:
+        return tuple(os.stat(name).st_mtime_ns for name in files)
+    except OSError:
+        return None
+
+def load_layout(path, compiled=False):
+    '''
+    Gets a parsed layout from the process cache, the compiled copy or the text files (in that order)
+    :param path: absolute path of .layout file
+    :param compiled: if True, reads and writes the compiled copy next to the .layout file
+    :return: returns dict as given by parse_layout
+    '''
+    cached = LAYOUT_CACHE.get(path)
+    if cached is not None and file_times(cached["files"]) == cached["times"]:
+        return cached
+    
+    compiled_path = path + COMPILED_EXTENSION
+    if compiled:
+        try:
+            with open(compiled_path, "rb") as fp:
+                cached = pickle.load(fp)
+            if cached.get("format") == LAYOUT_FORMAT and file_times(cached["files"]) == cached["times"]:
+                LAYOUT_CACHE[path] = cached
+                return cached
+        except Exception:
+            pass #missing, out of date or unreadable (e.g. naming a module which is gone), so parse it again
+    
+    parsed = parse_layout(path)
+    parsed["times"] = file_times(parsed["files"])
+    LAYOUT_CACHE[path] = parsed
+    
+    if compiled:
+        try:
+            temp_path = "%s.%d.tmp" % (compiled_path, os.getpid())
+            with open(temp_path, "wb") as fp:
+                pickle.dump(parsed, fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, compiled_path)
+        except OSError:
+            pass #assets folder may be read-only
+    
+    return parsed
+
+def packed_board_from_file(filename):
+    '''
+    Loads a map file straight into a PackedBoard, memory mapping it and translating
+    one row of bytes at a time so no per-character lists are ever built
+    :param filename: relative filename in assets directory of .map file
+    :return: returns PackedBoard (short rows are padded with EMPTY tiles)
+    '''
+    absolute_name = pathjoin(PROJECT_ROOT, "assets", filename)
+    with open(absolute_name, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return PackedBoard(0, 0) #empty files can't be mapped
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            #first pass finds the rows so the board is allocated once at its full size
+            spans = []
+            start = 0
+            while start < len(data):
+                end = data.find(b"\n", start)
+                if end < 0:
+                    end = len(data)
+                spans.append((start, end - 1 if end > start and data[end-1] == ord("\r") else end))
+                start = end + 1
+            
+            width = max([end - start for start, end in spans])
+            board = PackedBoard(width, len(spans))
+            cells = board.cells
+            for y, (start, end) in enumerate(spans):
+                row = data[start:end].translate(byte_mapping)
+                assert 0 not in row, "Unknown tile character in %s line %d" % (filename, y+1)
+                cells[y*width:y*width+len(row)] = row
+    return board
+
 def text_board_from_file(filename):
     '''
     Creates text board based on text file
@@ -123,10 +467,7 @@ def char_to_enum(char):
     '''
     Converts a single character to enum value
     '''
-    for key in text_mapping.keys():
-        if char in key:
-            return text_mapping[key]
-    return None
+    return char_mapping.get(char)
 
 def text_board_to_enum(text_board):
     '''
@@ -134,10 +475,8 @@ def text_board_to_enum(text_board):
     :param text_board: 2D array of chars as shown in assets/tests/gameboard_test.map
     :return: returns 2D array using numbers as shown in BOARD_ENUM
     '''
-    board = []
-    for row in text_board:
-        board.append([char_to_enum(char) for char in row])
-    return board
+    lookup = char_mapping.get
+    return [list(map(lookup, row)) for row in text_board]
 
 def board_from_text_file(filename):
     '''
@@ -156,6 +495,7 @@ def test():
     print(layout)
     print(layout.get_start())
     print(layout.next_map('learner', Direction.RIGHT))
+    print(layout.completable, layout.path_to_end(layout.get_start()[0]), layout.dead_rooms)
 
 if __name__ == "__main__":
     test()
\ No newline at end of file
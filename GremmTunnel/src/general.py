@@ -30,6 +30,14 @@ class Direction(IntEnum):
     RIGHT = 1
     DOWN = 2
     LEFT = 3
+
+#(dx, dy) change in position for one step in each direction
+DIRECTION_DELTA = {
+    Direction.UP : (0, -1),
+    Direction.RIGHT : (1, 0),
+    Direction.DOWN : (0, 1),
+    Direction.LEFT : (-1, 0),
+}
     
 def clock(direction, rotations=1):
     '''
@@ -46,4 +54,41 @@ class GremmType(Enum):
     Type of gremlin (in case it is needed in future versions)
     '''
     GOOD = 1
-    BAD = 2
\ No newline at end of file
+    BAD = 2
+
+@unique
+class Action(Enum):
+    '''
+    Player input which can be applied to a game
+    '''
+    MOVE = 1
+    LEFT = 2
+    RIGHT = 3
+    RESTART = 4
+    UNDO = 5
+    RESET = 6
+
+def split_args(args=None):
+    '''
+    Splits command line arguments into key=value options and everything else
+    :param args: list of strings or None for sys.argv[1:]
+    :return: returns tuple (dict of options, list of other arguments in order)
+    '''
+    kwargs = {}
+    positional = []
+    for arg in (sys.argv[1:] if args is None else args):
+        split = arg.split("=", maxsplit=1)
+        if len(split) > 1:
+            key, value = split
+            kwargs[key] = value
+        else:
+            positional.append(arg)
+    return kwargs, positional
+
+def is_true(value):
+    '''
+    Reads a flag which may be a string from the command line
+    :param value: bool or string
+    :return: returns False for False, "False", "false" and "0", True otherwise
+    '''
+    return value not in (False, "False", "false", "0")
@@ -0,0 +1,126 @@
+'''
+Generates random .map and .layout files for stress testing
+Run with key=value arguments, for example: python generator.py name=big rooms=1000 width=500 height=500
+'''
+
+import os
+import random
+from os.path import join as pathjoin
+
+from general import Direction, PROJECT_ROOT, split_args
+
+
+#characters of the tiles which fill a room (empty, wall, mirrors)
+FILL_CHARS = (" ", "#", "/", "\\")
+
+#characters on the edges of a room
+WALL = "#"
+DOOR = ":"
+
+#layout file letter of each door
+DIRECTION_LETTERS = {
+    Direction.UP : "N",
+    Direction.RIGHT : "E",
+    Direction.DOWN : "S",
+    Direction.LEFT : "W",
+}
+
+def room_rows(width, height, mirror_density=0.2, wall_density=0.05, rng=random):
+    '''
+    Generates the rows of a walled room with one door in the middle part of each edge
+    Doors on every edge mean a gremlin can come in going any direction (see gameboard.door_index)
+    and the tile inside each door is left empty so gremlins can get in and out
+    :param width: number of tiles across (at least 3)
+    :param height: number of tiles down (at least 3)
+    :param mirror_density: fraction of the inside which is mirrors
+    :param wall_density: fraction of the inside which is walls
+    :param rng: random.Random object (or the random module)
+    :return: returns generator of strings, one per row as in a .map file
+    '''
+    assert width >= 3 and height >= 3, "Rooms must be at least 3x3 to have doors"
+    assert mirror_density + wall_density <= 1, "Mirrors and walls can't cover more than the whole room"
+    weights = (1 - mirror_density - wall_density, wall_density, mirror_density / 2, mirror_density / 2)
+    top = rng.randrange(1, width-1)
+    bottom = rng.randrange(1, width-1)
+    left = rng.randrange(1, height-1)
+    right = rng.randrange(1, height-1)
+
+    yield WALL * top + DOOR + WALL * (width-top-1)
+    for y in range(1, height-1):
+        inside = rng.choices(FILL_CHARS, weights, k=width-2)
+        if y == 1:
+            inside[top-1] = " "
+        if y == height-2:
+            inside[bottom-1] = " "
+        if y == left:
+            inside[0] = " "
+        if y == right:
+            inside[-1] = " "
+        yield (DOOR if y == left else WALL) + "".join(inside) + (DOOR if y == right else WALL)
+    yield WALL * bottom + DOOR + WALL * (width-bottom-1)
+
+def room_links(index, rooms, rng=random):
+    '''
+    Picks where each door of a room leads
+    North goes on to the next room (the last one goes to END), south goes back a room
+    (the first one has no south link so it leads back to the start) and east and west are random
+    :param index: number of the room
+    :param rooms: total number of rooms
+    :return: returns list of (Direction enum, room number or "END") tuples
+    '''
+    links = [(Direction.UP, index+1 if index+1 < rooms else "END")]
+    links.append((Direction.RIGHT, rng.randrange(rooms)))
+    if index > 0:
+        links.append((Direction.DOWN, index-1))
+    links.append((Direction.LEFT, rng.randrange(rooms)))
+    return links
+
+def write_layout(folder, name, rooms=1, width=15, height=12, mirror_density=0.2, wall_density=0.05, seed=None):
+    '''
+    Writes a layout and its maps to a folder one row at a time, so any size fits in memory
+    :param folder: folder to write in (created if missing)
+    :param name: name of the .layout file (and prefix of its maps)
+    :param rooms: number of rooms
+    :param seed: seed for the random numbers or None for a different layout every time
+    :return: returns path of the .layout file, relative to the assets folder if it is inside it
+    '''
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    assets = pathjoin(PROJECT_ROOT, "assets")
+    layout_path = pathjoin(folder, name + ".layout")
+    with open(layout_path, "w") as layout_fp:
+        for index in range(rooms):
+            map_path = pathjoin(folder, "%s%d.map" % (name, index))
+            with open(map_path, "w") as map_fp:
+                for row_number, row in enumerate(room_rows(width, height, mirror_density, wall_density, rng)):
+                    map_fp.write(row if row_number == 0 else "\n" + row)
+
+            color = ",".join(str(rng.randrange(256)) for _ in range(3))
+            layout_fp.write("room%d %s %s\n" % (index, assets_name(map_path, assets), color))
+            for direction, link in room_links(index, rooms, rng):
+                layout_fp.write("\t%s %s\n" % (DIRECTION_LETTERS[direction], link if link == "END" else "room%d" % link))
+    return assets_name(layout_path, assets)
+
+def assets_name(path, assets):
+    '''
+    Gets the name to refer to a file by (relative to the assets folder if inside it, absolute otherwise)
+    '''
+    path = os.path.abspath(path)
+    relative = os.path.relpath(path, assets)
+    return path if relative.startswith("..") else relative
+
+def main():
+    '''
+    Writes a layout to assets/<name> from the command line arguments
+    '''
+    kwargs, _ = split_args()
+    name = kwargs.get("name", "generated")
+    folder = kwargs.get("folder", pathjoin(PROJECT_ROOT, "assets", name))
+    seed = int(kwargs["seed"]) if "seed" in kwargs else None
+    layout_file = write_layout(folder, name, int(kwargs.get("rooms", 1)), int(kwargs.get("width", 15)),
+                               int(kwargs.get("height", 12)), float(kwargs.get("mirrors", 0.2)),
+                               float(kwargs.get("walls", 0.05)), seed)
+    print(layout_file)
+
+if __name__ == "__main__":
+    main()
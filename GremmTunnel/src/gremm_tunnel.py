@@ -4,18 +4,12 @@
 Starts the game and gets all parts running in a way that they can interact
 '''
 
-import sys
-
 from engine import begin
+from general import split_args
 
 
 def get_args():
-    kwargs = {}
-    for arg in sys.argv[1:]:
-        split = arg.split("=", maxsplit=1)
-        if len(split) > 1:
-            key, value = split
-            kwargs[key] = value
+    kwargs, _ = split_args()
     return kwargs
 
 def main():
@@ -5,6 +5,9 @@ Also handles user input and passes filtered input to the engine
 
 import pygame
 import math
+import json
+import os
+from os.path import join as pathjoin, dirname, exists, expanduser
 from collections import OrderedDict
 
 from gameboard import board_from_text_file
@@ -24,8 +27,15 @@ BLUE = (50, 50, 255)
 RED = (255, 50, 50)
 TRANSPARENCY = pygame.SRCALPHA
 
-pygame.font.init()
-FONT = pygame.font.SysFont('Comic Sans MS', 60)
+FONT_NAME = 'Comic Sans MS'
+FONT_SIZE = 60
+OVERLAY_FONT_SIZE = 20
+
+#where resolved font files are remembered between runs (looking up system fonts is slow)
+FONT_CACHE = pathjoin(os.environ.get("XDG_CACHE_HOME") or expanduser(pathjoin("~", ".cache")), "gremm_tunnel", "fonts.json")
+
+#loaded fonts by (name, size)
+FONTS = {}
 
 GREMLIN_TYPE = {
     GremmType.GOOD : WHITE,
@@ -34,6 +44,9 @@ GREMLIN_TYPE = {
 
 SQRT3 = math.sqrt(3)
 
+#cache of rendered gremlin arrows by (direction, type, box size)
+SPRITES = {}
+
 
 class GameBoard():
     '''
@@ -45,22 +58,46 @@ class GameBoard():
         Creates GameBoard object from a board (created in gameboard modeule)
         '''
         pygame.init()
-        self.y_size = len(board)
-        self.x_size = max([len(row) for row in board])
-        self.max_y = BOX_SIZE*self.y_size
-        self.max_x = BOX_SIZE*self.x_size
-        self.screen = pygame.display.set_mode((self.max_x, self.max_y))
+        load_sprites()
+        self.screen = None
+        self.x_size = self.y_size = None
         self.background_color = background_color if background_color is not None else BLACK
+        self.layers = OrderedDict()
+        self.dirty = [] #rects to redraw on the next render, or None for everything
+        self.overlay_rect = None
+        self.profiler = None #profiler.Profiler to mark composition and flip time in, if profiling
+        
+        self.load_board(board, gremlins, alt_color)
+
+    def load_board(self, board, gremlins=[], alt_color=None):
+        '''
+        Swaps in a new board, reusing the window and layer surfaces
+        The window is only resized when the board dimensions change
+        '''
+        y_size = len(board)
+        x_size = max([len(row) for row in board])
+        if self.screen is None or (x_size, y_size) != (self.x_size, self.y_size):
+            self.y_size = y_size
+            self.x_size = x_size
+            self.max_y = BOX_SIZE*self.y_size
+            self.max_x = BOX_SIZE*self.x_size
+            self.screen = pygame.display.set_mode((self.max_x, self.max_y))
         self.alt_color = alt_color if alt_color is not None else WHITE
         
-        self.layers = OrderedDict([
-            ("background", self.make_background(board)),
-            ("gremlins", self.make_gremlins(gremlins)),
-            #("message", self.make_message()),
-        ])
+        self.layers.pop("message", None)
+        self.layers["background"] = self.make_background(board)
+        self.gremlins = list(gremlins)
         
-        self.redraw()
-        pygame.display.flip()
+        self.invalidate()
+
+    def reuse_surface(self, layer, flags=0):
+        '''
+        Gets the surface of a layer to draw over, or a new one if the window size changed
+        '''
+        surface = self.layers.get(layer)
+        if surface is None or surface.get_size() != (self.max_x, self.max_y):
+            surface = pygame.Surface((self.max_x, self.max_y), flags)
+        return surface
 
     def clear_message(self):
         self.update_message()
@@ -70,12 +107,12 @@ class GameBoard():
         Updates message
         '''
         self.layers["message"] = self.make_message(msg, background, text_color)
-        self.redraw()
+        self.invalidate()
         
     def make_message(self, msg=" ", background=TRANSPARENCY, text_color=BLACK):
         surface = pygame.Surface((self.max_x, self.max_y)).convert_alpha()
         surface.fill(background)
-        text = FONT.render(msg, True, text_color)
+        text = get_font().render(msg, True, text_color)
         
         text_x, text_y = text.get_size()
         x_offset = (self.max_x - text_x) / 2
@@ -84,62 +121,183 @@ class GameBoard():
         surface.blit(text, (x_offset, y_offset))
         return surface
 
-    def loop(self):
+    def update_overlay(self, lines=None):
+        '''
+        Shows lines of text in the top left corner over everything else
+        :param lines: list of strings or None to hide the overlay
+        '''
+        old_rect = self.overlay_rect
+        self.layers.pop("overlay", None)
+        self.overlay_rect = None
+        if lines is not None:
+            surface = pygame.Surface((self.max_x, self.max_y), TRANSPARENCY)
+            font = get_font(size=OVERLAY_FONT_SIZE)
+            rects = []
+            for line in lines:
+                text = font.render(line, True, WHITE, BLACK)
+                rects.append(surface.blit(text, (0, sum(rect.height for rect in rects))))
+            self.layers["overlay"] = surface
+            self.overlay_rect = rects[0].unionall(rects[1:]) if len(rects) > 0 else None
+        self.invalidate([rect for rect in (old_rect, self.overlay_rect) if rect is not None])
+
+    def loop(self, wait=False):
         '''
         Loops, returning commands from user
+        :param wait: if True, sleeps until there is at least one event instead of polling
         :return: returns tuple of simplified user commands
         '''
+        if wait:
+            events = [pygame.event.wait()]
+            events.extend(pygame.event.get())
+            return events
         events = pygame.event.get()
         return events
     
-    def blit_all(self, surface_name):
+    def blit_all(self, surface_name, rect=None, gremlins=None):
         '''
         Blits the specified layer and everything above it
+        Gremlin sprites are blitted straight on top of the background layer
+        :param rect: pygame.Rect area to blit or None for the whole window
+        :param gremlins: gremlins inside the area or None for all of them
         '''
+        rect = rect if rect is not None else self.screen.get_rect()
+        gremlins = gremlins if gremlins is not None else self.gremlins
         keys = list(self.layers.keys())
         index = keys.index(surface_name) #throws ValueError if non-existent
+        self.screen.set_clip(rect)
         for key in keys[index:]:
-            self.screen.blit(self.layers[key], (0,0))
+            self.screen.blit(self.layers[key], rect, rect)
+            if key == "background":
+                for gremlin in gremlins:
+                    self.screen.blit(gremlin_sprite(gremlin[1], gremlin[2]), tile_rect(gremlin[0]))
+        self.screen.set_clip(None)
     
-    def redraw(self):
+    def invalidate(self, rects=None):
         '''
-        Redraws everything
+        Marks areas of the window to be redrawn on the next render
+        :param rects: list of pygame.Rect areas or None for the whole window
         '''
-        keys = list(self.layers.keys())
-        index = 0
-        for key in keys[index:]:
-            self.screen.blit(self.layers[key], (0,0))
-            self.screen.blit(self.layers[key], (0,0))
-        pygame.display.flip()
+        if rects is None:
+            self.dirty = None
+        elif self.dirty is not None:
+            self.dirty.extend(rects)
+    
+    def render(self):
+        '''
+        Redraws whatever changed since the last render
+        :return: returns True if anything was drawn
+        '''
+        dirty = self.dirty
+        if dirty is not None and len(dirty) == 0:
+            return False
+        self.dirty = []
+        self.redraw(dirty)
+        return True
+    
+    def redraw(self, rects=None):
+        '''
+        Redraws everything, or only some dirty rectangles
+        :param rects: list of pygame.Rect areas to recompose and push to the display
+            or None to redraw the whole window
+        '''
+        if rects is None:
+            self.blit_all("background")
+            self.mark("compose")
+            pygame.display.flip()
+            self.mark("flip")
+        elif len(rects) > 0:
+            by_tile = {}
+            for gremlin in self.gremlins:
+                by_tile.setdefault(gremlin[0], []).append(gremlin)
+            for rect in rects:
+                inside = [gremlin for loc in rect_tiles(rect) for gremlin in by_tile.get(loc, ())]
+                self.blit_all("background", rect, inside)
+            self.mark("compose")
+            pygame.display.update(rects)
+            self.mark("flip")
+    
+    def mark(self, section):
+        '''
+        Marks the end of a section of the frame if profiling
+        '''
+        if self.profiler is not None:
+            self.profiler.mark(section)
         
-    def update_background(self, board):
+    def update_background(self, board, cells=None):
         '''
         Updates background with a new board
+        :param cells: list of (x,y) tiles which changed, or None to repaint the whole board
         '''
-        self.layers["background"] = self.make_background(board)
-        self.redraw()
+        if cells is None:
+            self.layers["background"] = self.make_background(board)
+            self.invalidate()
+            return
+        
+        background = self.layers["background"]
+        rects = []
+        for loc in cells:
+            #lines on a tile's edge spill over into its neighbors
+            rect = tile_rect(loc).inflate(2*LINE_WIDTH, 2*LINE_WIDTH).clip(background.get_rect())
+            #clipping changes how diagonal lines are drawn, so the neighborhood is painted whole onto a
+            #scratch surface (cut off only by the window's edges, like a full repaint) and the area copied over
+            first_col, last_col, first_row, last_row = self.tile_range(rect)
+            area = pygame.Rect(first_col*BOX_SIZE, first_row*BOX_SIZE, (last_col - first_col + 1)*BOX_SIZE,
+                               (last_row - first_row + 1)*BOX_SIZE).inflate(2*LINE_WIDTH, 2*LINE_WIDTH).clip(background.get_rect())
+            scratch = pygame.Surface(area.size, 0, background)
+            self.paint_background(scratch, board, rect, area.topleft)
+            background.blit(scratch, rect, rect.move(-area.left, -area.top))
+            rects.append(rect)
+        
+        self.invalidate(rects)
     
     def make_background(self, board):
         '''
         Draws background and lines
         '''
-        background = pygame.Surface((self.max_x, self.max_y))
-        background.fill(self.background_color)
+        background = self.reuse_surface("background")
+        self.paint_background(background, board, background.get_rect())
+        return background
+    
+    def tile_range(self, area):
+        '''
+        Gets the tiles whose lines or shapes can reach into an area of the window
+        :param area: pygame.Rect in window coordinates
+        :return: returns tuple (first column, last column, first row, last row)
+        '''
+        return (max(0, (area.left - LINE_WIDTH) // BOX_SIZE),
+                min(self.x_size - 1, (area.right - 1 + LINE_WIDTH) // BOX_SIZE),
+                max(0, (area.top - LINE_WIDTH) // BOX_SIZE),
+                min(self.y_size - 1, (area.bottom - 1 + LINE_WIDTH) // BOX_SIZE))
+    
+    def paint_background(self, background, board, area, origin=(0, 0)):
+        '''
+        Paints the background, lines and tiles which touch an area of the window
+        Tiles are drawn whole, so the surface must have room for them or lines get drawn differently
+        :param background: surface to paint on
+        :param board: 2D array of Tile enums
+        :param area: pygame.Rect to repaint, in window coordinates
+        :param origin: window x,y which is the top left corner of the surface
+        '''
+        first_col, last_col, first_row, last_row = self.tile_range(area)
+        off_x, off_y = origin
+        
+        background.fill(self.background_color, area.move(-off_x, -off_y))
         
-        for col in range(1, self.x_size):
-            x = col * BOX_SIZE
-            pygame.draw.line(background, self.alt_color, (x, 0), (x, self.max_y), LINE_WIDTH)
+        for col in range(max(1, first_col), min(self.x_size, last_col + 2)):
+            x = col * BOX_SIZE - off_x
+            pygame.draw.line(background, self.alt_color, (x, -off_y), (x, self.max_y - off_y), LINE_WIDTH)
             
-        for row in range(1, self.y_size):
-            y = row * BOX_SIZE
-            pygame.draw.line(background, self.alt_color, (0, y), (self.max_x, y), LINE_WIDTH)
+        for row in range(max(1, first_row), min(self.y_size, last_row + 2)):
+            y = row * BOX_SIZE - off_y
+            pygame.draw.line(background, self.alt_color, (-off_x, y), (self.max_x - off_x, y), LINE_WIDTH)
         
-        for row in range(0, self.y_size):
-            y = row * BOX_SIZE
-            for col in range(0, self.x_size):
-                x = col * BOX_SIZE
+        for row in range(first_row, last_row + 1):
+            y = row * BOX_SIZE - off_y
+            tiles = board[row]
+            for col in range(first_col, last_col + 1):
+                x = col * BOX_SIZE - off_x
                 
-                tile = board[row][col]
+                tile = tiles[col]
                 
                 if tile is Tile.BK_SLASH:
                     pygame.draw.line(background, self.alt_color, (x, y), (x+BOX_SIZE, y+BOX_SIZE), LINE_WIDTH)
@@ -169,36 +327,110 @@ class GameBoard():
                         pygame.draw.polygon(background, self.alt_color, points_list, 0)
                 elif tile is Tile.GENERIC_ITEM:
                     pygame.draw.circle(background, self.alt_color, (x+HALF_BOX, y+HALF_BOX), QUARTER_BOX, 0)
-        
-        return background
     
     def update_gremlins(self, gremlins):
         '''
-        Updates gremlins with a new list
+        Updates gremlins with a new list, redrawing only the tiles gremlins left or entered
         '''
-        self.layers["gremlins"] = self.make_gremlins(gremlins)
-        self.redraw()
+        changed = {gremlin[0] for gremlin in set(self.gremlins).symmetric_difference(gremlins)}
+        self.gremlins = list(gremlins)
+        self.invalidate([tile_rect(loc) for loc in changed])
         
-    def make_gremlins(self, gremlins):
+    def make_gremlins(self, gremlins, grem_surface=None):
         '''
         Draws gremlins (currently as arrows) on board
         :param gremlins: list of gremlins in format ((x,y), direction, type)
+        :param grem_surface: transparent window sized surface to clear and draw on or None for a new one
         Note: x and y coordinates are integers starting with 0 as top left corner
         '''
-        grem_surface = pygame.Surface((self.max_x, self.max_y), TRANSPARENCY)
+        if grem_surface is None or grem_surface.get_size() != (self.max_x, self.max_y):
+            grem_surface = pygame.Surface((self.max_x, self.max_y), TRANSPARENCY)
+        else:
+            grem_surface.fill((0, 0, 0, 0))
         
         for gremlin in gremlins:
-            raw_x, raw_y = gremlin[0]
-            direction = gremlin[1]
-            gremlin_type = gremlin[2]
-            
-            color = GREMLIN_TYPE.get(gremlin_type)
-            location = (raw_x*BOX_SIZE, raw_y*BOX_SIZE)
-            
-            pygame.draw.polygon(grem_surface, color, arrow(location=location, direction=direction))
+            grem_surface.blit(gremlin_sprite(gremlin[1], gremlin[2]), tile_rect(gremlin[0]))
         
         return grem_surface
     
+def tile_rect(loc):
+    '''
+    Gets the area of the window covered by a tile
+    :param loc: integer x,y tuple of the tile
+    :return: returns pygame.Rect of the tile
+    '''
+    return pygame.Rect(loc[0]*BOX_SIZE, loc[1]*BOX_SIZE, BOX_SIZE, BOX_SIZE)
+
+def get_font(name=FONT_NAME, size=FONT_SIZE):
+    '''
+    Gets a font, loading it (and pygame's font module) the first time it is used
+    :return: returns pygame.font.Font
+    '''
+    font = FONTS.get((name, size))
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = FONTS[(name, size)] = pygame.font.Font(font_path(name), size)
+    return font
+
+def font_path(name):
+    '''
+    Finds the file of a system font, remembering it on disk for the next run
+    :return: returns path of font file or None for pygame's default font
+    '''
+    try:
+        with open(FONT_CACHE) as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        cache = {}
+    
+    path = cache.get(name, "")
+    if path is None or (path and exists(path)):
+        return path
+    
+    path = pygame.font.match_font(name)
+    cache[name] = path
+    try:
+        os.makedirs(dirname(FONT_CACHE), exist_ok=True)
+        with open(FONT_CACHE, "w") as fp:
+            json.dump(cache, fp)
+    except OSError:
+        pass #no cache this time
+    return path
+
+def rect_tiles(rect):
+    '''
+    Gets every tile which an area of the window touches
+    :param rect: pygame.Rect area of the window
+    :return: returns list of integer x,y tuples
+    '''
+    return [(col, row)
+            for row in range(rect.top // BOX_SIZE, (rect.bottom - 1) // BOX_SIZE + 1)
+            for col in range(rect.left // BOX_SIZE, (rect.right - 1) // BOX_SIZE + 1)]
+
+def gremlin_sprite(direction, gremlin_type):
+    '''
+    Gets the pre-rendered sprite of a gremlin (currently as an arrow), rendering it on first use
+    :param direction: Direction enum the arrow points
+    :param gremlin_type: GremmType enum which sets the color
+    :return: returns BOX_SIZE square pygame.Surface with transparency
+    '''
+    key = (direction, gremlin_type, BOX_SIZE)
+    sprite = SPRITES.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((BOX_SIZE, BOX_SIZE), TRANSPARENCY)
+        pygame.draw.polygon(sprite, GREMLIN_TYPE.get(gremlin_type), arrow(direction=direction))
+        SPRITES[key] = sprite
+    return sprite
+
+def load_sprites():
+    '''
+    Renders every gremlin sprite up front so drawing gremlins is only blits
+    '''
+    for direction in Direction:
+        for gremlin_type in GremmType:
+            gremlin_sprite(direction, gremlin_type)
+    
 def arrow(box_size=BOX_SIZE, location=(0,0), direction=Direction.RIGHT):
     '''
     Creates arrow arrow coordinates
@@ -226,7 +458,8 @@ def test():
     board.update_message("msg", BLACK, WHITE)
     board.clear_message()
     while not done:
-        for event in board.loop():
+        board.render()
+        for event in board.loop(wait=True):
             if event.type == pygame.QUIT:
                 done = True
 
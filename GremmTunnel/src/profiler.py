@@ -0,0 +1,119 @@
+'''
+Opt-in per-frame timings and hot path counters for the engine
+'''
+
+from collections import Counter
+import csv
+import json
+import time
+
+
+#parts of a frame in the order they happen in the engine loop
+SECTIONS = ("compose", "flip", "sleep", "wait", "events", "forward", "collision")
+
+#counters kept for each frame
+COUNTERS = ("searches", "states")
+
+class Profiler():
+    '''
+    Splits the time of each frame between sections by marking when each one ends
+    Time since the previous mark goes to the section being marked, so marks have to
+    be placed in the order things happen
+    '''
+
+    def __init__(self, filename=None):
+        '''
+        Starts an empty trace
+        :param filename: .json or .csv file to write the trace to on dump or None to keep it in memory
+        '''
+        self.filename = filename
+        self.origin = time.perf_counter()
+        self.last = self.origin
+        self.frame = None
+        self.frames = []
+        self.depths = Counter() #deepest search of each uncached forward call
+
+    def begin_frame(self):
+        '''
+        Starts timing a new frame
+        '''
+        self.last = time.perf_counter()
+        self.frame = dict.fromkeys(SECTIONS + COUNTERS, 0)
+        self.frame["start"] = self.last - self.origin
+
+    def mark(self, section):
+        '''
+        Adds the time since the last mark to a section of the current frame
+        :param section: name from SECTIONS
+        '''
+        now = time.perf_counter()
+        if self.frame is not None:
+            self.frame[section] += now - self.last
+        self.last = now
+
+    def searched(self, depth, states):
+        '''
+        Counts one forward call which had to search the gremlin state graph
+        :param depth: deepest the search went (the recursion depth it would have needed)
+        :param states: number of states visited
+        '''
+        self.depths[depth] += 1
+        if self.frame is not None:
+            self.frame["searches"] += 1
+            self.frame["states"] += states
+
+    def end_frame(self):
+        '''
+        Finishes the current frame, giving anything since the last mark to event handling
+        '''
+        if self.frame is not None:
+            self.mark("events")
+            self.frame["total"] = self.last - self.origin - self.frame["start"]
+            self.frames.append(self.frame)
+            self.frame = None
+
+    def histogram(self):
+        '''
+        Groups search depths into power of two buckets
+        :return: returns list of (largest depth in bucket, number of searches) tuples
+        '''
+        buckets = Counter()
+        for depth, count in self.depths.items():
+            buckets[2 ** (depth - 1).bit_length()] += count
+        return sorted(buckets.items())
+
+    def summary(self, total_moves=0, level_moves=0):
+        '''
+        Describes the last frame and the search depths so far
+        :return: returns list of strings, one per line
+        '''
+        if len(self.frames) == 0:
+            return ["no frames yet"]
+        frame = self.frames[-1]
+        busy = frame["total"] - frame["sleep"] - frame["wait"]
+        return [
+            "frame %d: %.2fms busy, %.2fms total" % (len(self.frames), busy * 1000, frame["total"] * 1000),
+            " ".join("%s %.2f" % (section, frame[section] * 1000) for section in SECTIONS if section not in ("sleep", "wait")),
+            "moves %d (room %d) searches %d states %d" % (total_moves, level_moves, frame["searches"], frame["states"]),
+            "depth " + " ".join("<=%d:%d" % bucket for bucket in self.histogram()),
+        ]
+
+    def dump(self, filename=None):
+        '''
+        Writes the trace as CSV (one row per frame, times in milliseconds) or JSON (frames with times
+        in seconds, and search depth counts)
+        :param filename: file to write or None for the one given when created
+        '''
+        filename = filename if filename is not None else self.filename
+        if filename is None:
+            return
+        columns = ("start", "total") + SECTIONS + COUNTERS
+        if filename.endswith(".csv"):
+            with open(filename, "w", newline="") as fp:
+                writer = csv.writer(fp)
+                writer.writerow(columns)
+                for frame in self.frames:
+                    writer.writerow([round(frame[column] * 1000, 4) if column not in COUNTERS else frame[column] for column in columns])
+        else:
+            with open(filename, "w") as fp:
+                json.dump({"frames": self.frames, "depths": sorted(self.depths.items())}, fp)
@@ -0,0 +1,129 @@
+'''
+Records player inputs to a log and plays logs back headless as fast as possible
+'''
+
+import hashlib
+import sys
+import time
+
+from gameboard import BoardLayout
+from general import Action
+from simulation import Simulation
+
+
+class Recorder():
+    '''
+    Appends every action of a game to a log file, one line per action
+    A session is a "layout" line, then "tick room action" lines, then an "end" line with the state digest
+    '''
+
+    def __init__(self, filename, layout_file):
+        '''
+        Opens the log (appending) and starts a new session
+        :param filename: path of log file
+        :param layout_file: name of .layout file being played
+        '''
+        self.fp = open(filename, "a")
+        self.fp.write("layout %s\n" % layout_file)
+
+    def record(self, tick, room, action):
+        '''
+        Records one action
+        :param tick: time (or frame) the action happened at
+        :param room: name of the room the action was taken in
+        :param action: Action enum
+        '''
+        self.fp.write("%d %s %s\n" % (tick, room, action.name))
+        self.fp.flush()
+
+    def close(self, sim):
+        '''
+        Ends the session with a digest of the final state (does nothing if already closed)
+        :param sim: Simulation the actions were applied to
+        '''
+        if self.fp is not None:
+            self.fp.write("end %s\n" % state_digest(sim))
+            self.fp.close()
+            self.fp = None
+
+def state_digest(sim):
+    '''
+    Hashes the state of a game so replays can be checked against the original
+    :param sim: Simulation to hash
+    :return: returns hex string
+    '''
+    digest = hashlib.sha1()
+    digest.update(("%s %s %s\n" % (sim.board_name, sim.won, sorted(
+        (loc, direction.value, gremm_type.value) for loc, direction, gremm_type in sim.gremlins))).encode())
+    for name in sorted(sim.boards):
+        digest.update(name.encode())
+        digest.update(bytes(sim.boards[name].cells))
+    return digest.hexdigest()
+
+def read_log(filename):
+    '''
+    Reads the sessions of a log file
+    :param filename: path of log file
+    :return: returns list of (layout file, [(tick, room, Action)], digest or None) tuples
+    '''
+    sessions = []
+    with open(filename) as fp:
+        for line in fp:
+            parts = line.split()
+            if len(parts) == 0:
+                continue
+            if parts[0] == "layout":
+                sessions.append((parts[1], [], None))
+            elif parts[0] == "end":
+                layout_file, actions, _ = sessions[-1]
+                sessions[-1] = (layout_file, actions, parts[1])
+            else:
+                tick, room, action = parts
+                sessions[-1][1].append((int(tick), room, Action[action]))
+    return sessions
+
+def new_game(layout_file):
+    '''
+    Starts a headless game the way the engine does, so recorded undos can be played back
+    :param layout_file: name of .layout file in the assets folder
+    :return: returns Simulation keeping undo history
+    '''
+    return Simulation(BoardLayout(layout_file), undo=True)
+
+def play(layout_file, actions, digest=None):
+    '''
+    Replays one session headless
+    :param layout_file: name of .layout file in the assets folder
+    :param actions: list of (tick, room, Action) as read by read_log
+    :param digest: expected final state digest or None to skip the check
+    :return: returns the Simulation after the last action
+    '''
+    sim = new_game(layout_file)
+    for index, (tick, room, action) in enumerate(actions):
+        assert sim.board_name == room, "Action %d (tick %d) expected room %s but was in %s" % (index, tick, room, sim.board_name)
+        sim.act(action)
+    if digest is not None:
+        assert state_digest(sim) == digest, "Final state doesn't match the recording"
+    return sim
+
+def main():
+    '''
+    Replays every session of the log files on the command line and reports throughput
+    '''
+    failed = False
+    for filename in sys.argv[1:]:
+        for index, (layout_file, actions, digest) in enumerate(read_log(filename)):
+            start = time.perf_counter()
+            try:
+                play(layout_file, actions, digest)
+                result = "ok" if digest is not None else "ok (unfinished, not checked)"
+            except AssertionError as error:
+                result = "FAILED: %s" % error
+                failed = True
+            seconds = time.perf_counter() - start
+            rate = len(actions) / seconds if seconds > 0 else 0
+            print("%s #%d %s: %d actions in %.4fs (%.0f actions/s) %s" % (filename, index, layout_file, len(actions), seconds, rate, result))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+'''
+Pure game logic - applies moves and rotations to a layout without any rendering
+'''
+
+from collections import Counter, deque, namedtuple
+from itertools import repeat
+
+from gameboard import BoardLayout, PackedBoard
+from general import Tile, GremmType, Direction, Action, DIRECTION_DELTA, clock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None #moves are only stepped one gremlin at a time
+
+
+#byte values of tiles in a PackedBoard
+OCCUPIED = Tile.OCCUPIED.value
+FW_SLASH = Tile.FW_SLASH.value
+BK_SLASH = Tile.BK_SLASH.value
+DOOR = Tile.DOOR.value
+
+#which directions a gremlin splits into when it walks into a mirror (by tile byte value)
+MIRROR_SPLITS = {
+    (FW_SLASH, Direction.UP) : (Direction.UP, Direction.RIGHT),
+    (FW_SLASH, Direction.RIGHT) : (Direction.UP, Direction.RIGHT),
+    (FW_SLASH, Direction.DOWN) : (Direction.DOWN, Direction.LEFT),
+    (FW_SLASH, Direction.LEFT) : (Direction.DOWN, Direction.LEFT),
+    (BK_SLASH, Direction.DOWN) : (Direction.DOWN, Direction.RIGHT),
+    (BK_SLASH, Direction.RIGHT) : (Direction.DOWN, Direction.RIGHT),
+    (BK_SLASH, Direction.UP) : (Direction.UP, Direction.LEFT),
+    (BK_SLASH, Direction.LEFT) : (Direction.UP, Direction.LEFT),
+}
+
+#clock() results looked up by (direction, rotations) to keep enum calls off the hot path
+TURNS = {(direction, rotations) : clock(direction, rotations) for direction in Direction for rotations in (-1, 1, 2)}
+
+#Direction enums by value
+DIRECTIONS = sorted(Direction)
+
+#fewest gremlins to step together with NumPy (below this the array setup costs more than it saves)
+BATCH_MIN = 128
+
+if numpy is not None:
+    #tables indexed by Direction value for batch_step
+    DELTA_X = numpy.array([DIRECTION_DELTA[direction][0] for direction in DIRECTIONS])
+    DELTA_Y = numpy.array([DIRECTION_DELTA[direction][1] for direction in DIRECTIONS])
+    REVERSE = numpy.array([TURNS[direction, 2].value for direction in DIRECTIONS])
+    
+    #whether a gremlin stops on a tile (indexed by tile byte value)
+    RESTING = numpy.zeros(256, dtype=bool)
+    RESTING[[Tile.EMPTY.value, Tile.GENERIC_ITEM.value]] = True
+
+#most snapshots kept to undo to
+UNDO_LIMIT = 1000
+
+#immutable copy of a game, sharing the bytes of every board which didn't change since the last one
+#boards is a tuple of (room name, bytes of tiles) and entry is the snapshot of entering the room
+Snapshot = namedtuple("Snapshot", "room boards gremlins total_moves level_moves won lost entry")
+
+class Simulation():
+    '''
+    Simulation holds the state of one game and steps it without pygame
+    Subclasses (like the engine) can observe it by overriding the *_changed methods
+    '''
+
+    def __init__(self, layout, undo=False):
+        '''
+        Begins a game on the starting room of a layout
+        :param layout: BoardLayout object or name of .layout file in the assets folder
+        :param undo: if True, keeps a snapshot before each action so Action.UNDO can go back
+        '''
+        self.total_moves = 0
+        self.level_moves = 0
+        self.won = False
+        self.lost = False
+        self.moved = False
+
+        #board revision invalidates memoized gremlin outcomes
+        self.revision = 0
+        self.outcomes = {}
+        self.outcomes_revision = 0
+
+        self.layout = layout if isinstance(layout, BoardLayout) else BoardLayout(layout)
+        self.boards = {}
+        self.frozen = {} #bytes of each board as of the last snapshot, dropped when the board changes
+        self.history = deque(maxlen=UNDO_LIMIT) if undo else None
+        self.entry = None
+        self.init_board()
+        self.first_snapshot = self.snapshot()
+
+    def room_board(self, name):
+        '''
+        Gets the board of a room for this game (copied so the layout is never mutated)
+        :param name: name of the room in the layout
+        :return: returns PackedBoard which persists between visits
+        '''
+        board = self.boards.get(name)
+        if board is None:
+            board = self.boards[name] = self.layout.maps[name].copy()
+        return board
+
+    def restart(self):
+        '''
+        Starts the game over from the first room with fresh boards
+        '''
+        self.restore(self.first_snapshot)
+        if self.history is not None:
+            self.history.clear()
+    
+    def reset_room(self):
+        '''
+        Puts the current room back the way it was when the gremlin came in
+        '''
+        self.restore(self.entry)
+    
+    def undo(self):
+        '''
+        Goes back to before the last move, rotation or room reset (if keeping history)
+        '''
+        if self.history:
+            self.restore(self.history.pop())
+    
+    def snapshot(self):
+        '''
+        Takes an immutable copy of the game, only copying boards which changed since the last one
+        :return: returns Snapshot
+        '''
+        boards = []
+        for name, board in self.boards.items():
+            cells = self.frozen.get(name)
+            if cells is None:
+                cells = self.frozen[name] = bytes(board.cells)
+            boards.append((name, cells))
+        return Snapshot(self.board_name, tuple(boards), tuple(self.gremlins), self.total_moves,
+                        self.level_moves, self.won, self.lost, self.entry)
+    
+    def restore(self, snapshot):
+        '''
+        Returns the game to a snapshot, only rewriting boards which changed since it was taken
+        Rooms first visited after the snapshot are forgotten so they start fresh again
+        :param snapshot: Snapshot taken from this game
+        '''
+        saved = dict(snapshot.boards)
+        for name in [name for name in self.boards if name not in saved]:
+            del self.boards[name]
+            self.frozen.pop(name, None)
+        
+        same_room = snapshot.room == self.board_name
+        changed = []
+        for name, cells in saved.items():
+            board = self.boards.get(name)
+            if board is None:
+                layout_board = self.layout.maps[name]
+                board = self.boards[name] = PackedBoard(layout_board.width, layout_board.height, bytearray(cells))
+            elif self.frozen.get(name) is not cells:
+                if same_room and name == snapshot.room:
+                    changed = [(index % board.width, index // board.width)
+                               for index, (old, new) in enumerate(zip(board.cells, cells)) if old != new]
+                board.cells[:] = cells
+            self.frozen[name] = cells
+        
+        self.board_name = snapshot.room
+        self.board = self.boards[snapshot.room]
+        self.max_y = self.board.height
+        self.max_x = self.board.width
+        self.revision += 1
+        self.gremlins = list(snapshot.gremlins)
+        self.total_moves = snapshot.total_moves
+        self.level_moves = snapshot.level_moves
+        self.won = snapshot.won
+        self.lost = snapshot.lost
+        self.moved = False
+        self.entry = snapshot.entry if snapshot.entry is not None else snapshot
+        
+        if not same_room:
+            self.room_changed()
+        else:
+            if len(changed) > 0:
+                self.board_changed(changed)
+            self.gremlins_changed()
+        self.restored()
+
+    def win(self):
+        '''
+        Marks the game as won
+        '''
+        self.won = True
+
+    def lose(self):
+        '''
+        Marks the game as lost (no gremlins are left, or one is trapped bouncing around forever)
+        '''
+        self.lost = True
+
+    def init_board(self, direction=Direction.UP, current_name=None):
+        '''
+        Initializes next board from the layout object and updates object accordingly
+        :param direction: direction to go out of room
+        :param current_name: name of current room (to go to next room) or None to get first room
+        '''
+        won = False
+        new_direction = direction
+        name = current_name
+        if current_name is not None:
+            next_map = self.layout.next_map(current_name, direction)
+            if next_map is None:
+                won = True
+            else:
+                name, _, new_direction = next_map
+        else:
+            name, _ = self.layout.get_start()
+
+        self.enter_room(name, new_direction)
+
+        if won:
+            self.win()
+
+    def enter_room(self, name, direction=Direction.UP):
+        '''
+        Loads a room with its first gremlin coming in through a door
+        :param name: name of the room in the layout
+        :param direction: direction the gremlin is going as it comes in
+        '''
+        self.board_name = name
+        self.board = self.room_board(name)
+        self.revision += 1
+        self.max_y = self.board.height
+        self.max_x = self.board.width
+
+        self.gremlins = self.first_gremlin(direction)
+        self.entry = None
+        self.entry = self.snapshot()
+        self.room_changed()
+
+    def exit_room(self, direction):
+        '''
+        Leaves the current room through a door into the next one
+        :param direction: direction of the door the gremlin went out of
+        '''
+        self.init_board(direction, self.board_name)
+
+    def room_changed(self):
+        '''
+        Called after a new room is loaded
+        '''
+        pass
+
+    def gremlins_changed(self):
+        '''
+        Called after the gremlins move, turn or collide
+        '''
+        pass
+
+    def board_changed(self, cells):
+        '''
+        Called after tiles of the current board change
+        :param cells: list of (x,y) locations which changed
+        '''
+        pass
+
+    def restored(self):
+        '''
+        Called after the game is restored to a snapshot (after the other hooks)
+        '''
+        pass
+
+    def forward_searched(self, depth, states):
+        '''
+        Called after forward had to search for an outcome which wasn't memoized
+        :param depth: deepest the search went (what the recursion depth would have been)
+        :param states: number of gremlin states visited
+        '''
+        pass
+    
+    def act(self, action):
+        '''
+        Applies a single player action followed by collision detection (if gremlins changed)
+        :param action: Action enum to apply
+        :return: returns False if the action left the room or went back to an earlier state, True otherwise
+        '''
+        result = True
+        if self.history is not None and action in (Action.MOVE, Action.LEFT, Action.RIGHT, Action.RESET):
+            self.history.append(self.snapshot())
+        if action is Action.MOVE:
+            result = self.move()
+        elif action is Action.LEFT:
+            self.rotate(1)
+        elif action is Action.RIGHT:
+            self.rotate(-1)
+        elif action is Action.RESTART:
+            self.restart()
+            return False
+        elif action is Action.UNDO:
+            self.undo()
+            return False
+        elif action is Action.RESET:
+            self.reset_room()
+            return False
+        if self.moved:
+            self.collision_detect()
+        return result
+
+    def run(self, actions):
+        '''
+        Applies a sequence of actions, stopping early if the game is won or lost
+        :param actions: iterable of Action enums
+        :return: returns number of actions applied
+        '''
+        count = 0
+        for action in actions:
+            if self.won or self.lost:
+                break
+            self.act(action)
+            count += 1
+        return count
+
+    def first_gremlin(self, direction=Direction.UP):
+        '''
+        Finds the first gremlin in a map based on the door patterns
+        :param direction: direction to go into map (not side to start on)
+        :return: returns a list of one gremlin ((x,y),direction,type)
+        '''
+        loc = self.layout.doors[self.board_name]["entries"].get(direction)
+        if loc is not None:
+            return [(loc, direction, GremmType.GOOD)]
+
+        print("Error: no first door detected")
+        return []
+
+    def move(self):
+        '''
+        Moves gremlins straight (and then some)
+        :return: returns False if a door was hit or a gremlin got lost, True otherwise
+        '''
+        gremlins = self.gremlins
+        new_gremlins = []
+        stepped = repeat(None)
+        if numpy is not None and len(gremlins) >= BATCH_MIN:
+            stepped = self.batch_step(gremlins)
+            if None not in stepped:
+                #every gremlin took a single step
+                new_gremlins = stepped
+                gremlins = ()
+        
+        for (location, direction, gremm_type), gremlin in zip(gremlins, stepped):
+            if gremlin is not None:
+                new_gremlins.append(gremlin)
+                continue
+            outcome = self.forward((location[0], location[1], direction))
+            if len(outcome) == 0:
+                #trapped in a loop which never comes to rest
+                self.lose()
+                return False
+            for (loc, new_direction), count in outcome.items():
+                if new_direction is None:
+                    #a door yay!
+                    self.exit_room(self.which_door(loc))
+                    return False
+                new_gremlins.extend([(loc, new_direction, gremm_type)] * count)
+
+        self.gremlins = new_gremlins
+        self.moved = True
+        self.gremlins_changed()
+
+        self.total_moves += 1
+        self.level_moves += 1
+
+        return True
+
+    def batch_step(self, gremlins):
+        '''
+        Moves every gremlin whose move is a single step with NumPy array operations
+        That is walking onto a resting tile, or bouncing off a wall back onto one; mirrors and
+        doors are left for forward
+        :param gremlins: list of gremlins ((x,y), direction, type)
+        :return: returns list with each gremlin moved or None where it needs forward
+        '''
+        locations, directions, types = zip(*gremlins)
+        xs, ys = zip(*locations)
+        xs, ys, directions = numpy.array(xs), numpy.array(ys), numpy.array(directions, dtype=numpy.intp)
+        cells = numpy.frombuffer(self.board.cells, dtype=numpy.uint8)
+        
+        next_xs = xs + DELTA_X[directions]
+        next_ys = ys + DELTA_Y[directions]
+        inside = (next_xs >= 0) & (next_xs < self.max_x) & (next_ys >= 0) & (next_ys < self.max_y)
+        next_tiles = numpy.full(len(gremlins), OCCUPIED, dtype=numpy.uint8)
+        next_tiles[inside] = cells[next_ys[inside]*self.max_x + next_xs[inside]]
+        
+        rest = RESTING[next_tiles]
+        bounce = (next_tiles == OCCUPIED) & RESTING[cells[ys*self.max_x + xs]]
+        new_xs = numpy.where(rest, next_xs, xs).tolist()
+        new_ys = numpy.where(rest, next_ys, ys).tolist()
+        new_directions = numpy.where(rest, directions, REVERSE[directions]).tolist()
+        
+        return [((x, y), DIRECTIONS[direction], gremm_type) if simple else None
+                for x, y, direction, simple, gremm_type in zip(new_xs, new_ys, new_directions, (rest | bounce).tolist(), types)]
+    
+    def step(self, state):
+        '''
+        Moves a single gremlin state one tile forward without following it any further
+        :param state: (x, y, direction) of a gremlin about to move
+        :return: returns tuple (next states, end) where next states are (x, y, direction) states
+            which keep going and end is a ((x,y), direction) resting place or None
+            (direction is None when the gremlin stops in a door)
+        '''
+        x, y, direction = state
+        dx, dy = DIRECTION_DELTA[direction]
+        new_x, new_y = x+dx, y+dy
+
+        if not (0 <= new_x < self.max_x) or not (0 <= new_y < self.max_y):
+            #out of bounds -> turn around
+            return ((new_x, new_y, TURNS[direction, 2]),), None
+
+        next_tile = self.board.cells[new_y*self.max_x + new_x]
+        if next_tile == OCCUPIED:
+            #occupied so turn around
+            return ((new_x, new_y, TURNS[direction, 2]),), None
+        elif next_tile == FW_SLASH or next_tile == BK_SLASH:
+            return tuple((new_x, new_y, split) for split in MIRROR_SPLITS[next_tile, direction]), None
+        elif next_tile == DOOR:
+            return (), ((new_x, new_y), None)
+        else:
+            return (), ((new_x, new_y), direction)
+
+    def forward(self, state):
+        '''
+        Follows a gremlin through every bounce and mirror split until all its copies come to rest
+        Works iteratively over the strongly connected components of the state graph (Tarjan)
+        so outcomes can be memoized per state until the board changes
+        :param state: (x, y, direction) of a gremlin about to move
+        :return: returns ordered dict-like mapping of ((x,y), direction) resting places to the
+            number of gremlins ending there (capped at 2, which is already a collision),
+            empty if every copy is trapped in loops which never come to rest
+        '''
+        if self.outcomes_revision != self.revision:
+            self.outcomes = {}
+            self.outcomes_revision = self.revision
+        outcomes = self.outcomes
+        if state in outcomes:
+            return outcomes[state]
+
+        steps = {}
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        counter = 0
+
+        def visit(node):
+            nonlocal counter
+            index[node] = low[node] = counter
+            counter += 1
+            stack.append(node)
+            on_stack.add(node)
+            steps[node] = self.step(node)
+            return (node, iter(steps[node][0]))
+
+        calls = [visit(state)]
+        deepest = 1
+        while calls:
+            node, children = calls[-1]
+            for child in children:
+                if child in outcomes:
+                    continue
+                if child not in index:
+                    calls.append(visit(child))
+                    if len(calls) > deepest:
+                        deepest = len(calls)
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                calls.pop()
+                if calls:
+                    parent = calls[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = stack[stack.index(node):]
+                    del stack[len(stack)-len(component):]
+                    on_stack.difference_update(component)
+                    self.resolve(component, steps)
+
+        self.forward_searched(deepest, counter)
+        return outcomes[state]
+
+    def resolve(self, component, steps):
+        '''
+        Memoizes the outcome of a finished strongly connected component of gremlin states
+        :param component: list of states in the component (in discovery order)
+        :param steps: dict of state to its step() result
+        '''
+        members = set(component)
+        outcome = {}
+        for member in component:
+            children, end = steps[member]
+            if end is not None:
+                outcome[end] = min(2, outcome.get(end, 0) + 1)
+            for child in children:
+                if child not in members:
+                    for child_end, count in self.outcomes[child].items():
+                        outcome[child_end] = min(2, outcome.get(child_end, 0) + count)
+
+        if len(component) > 1:
+            #gremlins can loop here forever, so anything they reach is reached more than once
+            outcome = {end: 2 for end in outcome}
+
+        for member in component:
+            self.outcomes[member] = outcome
+
+    def rotate(self, direction):
+        '''
+        Rotates the gremlins 90 degrees
+        :param direction: if positive or zero, rotates counter clockwise; clockwise else
+        '''
+        rotations = 1 if direction >= 0 else -1
+        self.gremlins = [(loc, TURNS[gremm_dir, rotations], gremm_type) for loc, gremm_dir, gremm_type in self.gremlins]
+        self.moved = True
+        self.gremlins_changed()
+
+    def collision_detect(self):
+        '''
+        Detects collisions and turns any collisions to OCCUPIED tiles in the board
+        :return: returns list of (x,y) locations which collided
+        '''
+        self.moved = False
+        locations = [gremlin[0] for gremlin in self.gremlins]
+        if len(set(locations)) == len(locations):
+            return []
+        counts = Counter(locations)
+        collisions = [loc for loc, count in counts.items() if count > 1]
+
+        if len(collisions) > 0:
+            cells = self.board.cells
+            for x, y in collisions:
+                cells[y*self.max_x + x] = OCCUPIED
+            self.frozen.pop(self.board_name, None)
+            self.gremlins = [gremlin for gremlin in self.gremlins if counts[gremlin[0]] == 1]
+
+            self.revision += 1
+            self.board_changed(collisions)
+            self.gremlins_changed()
+            if len(self.gremlins) == 0:
+                self.lose()
+
+        return collisions
+
+    def which_door(self, loc):
+        '''
+        Determines which door is at a location
+        :param loc: integer x,y tuple at edge of board
+        :return: returns a direction enum for which way the gremlin would be going if it went directly out the door
+        '''
+        #if the place isn't a door, that's a persnal problem
+        return self.layout.doors[self.board_name]["exits"].get(loc)
+
+def test():
+    '''
+    Test function plays a few moves headless and prints the state
+    '''
+    sim = Simulation("gbd1/gbd1.layout")
+    print(sim.board_name, sim.gremlins)
+    sim.run([Action.MOVE, Action.MOVE, Action.RIGHT, Action.MOVE, Action.MOVE])
+    print(sim.board_name, sim.gremlins, sim.total_moves)
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,254 @@
+'''
+Breadth-first solver which finds the shortest way out of each room of a layout
+'''
+
+from collections import deque
+import heapq
+
+from gameboard import BoardLayout, PackedBoard
+from general import Direction, Action, split_args
+from simulation import Simulation
+
+
+#stop searching a room after this many distinct states (enough for every shipped room but hard,
+#which is still cut off at several million, at a few hundred MB per search)
+MAX_STATES = 1000000
+
+#actions the search tries from each state
+ACTIONS = (Action.MOVE, Action.LEFT, Action.RIGHT)
+
+class RoomSimulation(Simulation):
+    '''
+    Simulation of a single room which records doors instead of going through them
+    '''
+
+    def __init__(self, layout, name, direction):
+        '''
+        Starts a fresh copy of a room
+        :param layout: BoardLayout object the room belongs to
+        :param name: name of the room in the layout
+        :param direction: direction the first gremlin is going as it comes in
+        '''
+        self.exit = None
+        self.memos = {}
+        self.boards_seen = {}
+        Simulation.__init__(self, layout)
+        if name != self.board_name or direction is not Direction.UP:
+            self.enter_room(name, direction)
+
+    def exit_room(self, direction):
+        '''
+        Records which door was hit instead of loading the next room
+        '''
+        self.exit = direction
+
+    def key(self):
+        '''
+        Gets the canonical hashable form of the room state (board tiles and gremlin set)
+        '''
+        gremlins = tuple(sorted((loc, direction, gremm_type.value) for loc, direction, gremm_type in self.gremlins))
+        cells = bytes(self.board.cells)
+        #many states share a board so only keep one copy of each
+        return self.boards_seen.setdefault(cells, cells), gremlins
+
+    def load(self, cells, gremlins):
+        '''
+        Restores a room state found earlier in the search
+        :param cells: bytes of the board tiles
+        :param gremlins: list of gremlins
+        '''
+        if cells != self.board.cells:
+            self.board = PackedBoard(self.max_x, self.max_y, bytearray(cells))
+            self.revision += 1
+            self.remember(cells)
+        self.gremlins = list(gremlins)
+        self.exit = None
+
+    def remember(self, cells):
+        '''
+        Switches to the memoized gremlin outcomes of a board (they only depend on the board)
+        :param cells: bytes of the board tiles, which must match the current board
+        '''
+        self.outcomes = self.memos.setdefault(cells, {})
+        self.outcomes_revision = self.revision
+
+    def doors(self):
+        '''
+        Gets the direction of every door in the room
+        :return: returns set of Direction enums
+        '''
+        return set(self.layout.doors[self.board_name]["exits"].values())
+
+def solve_room(layout, name, direction=Direction.UP, max_states=MAX_STATES):
+    '''
+    Searches every reachable state of a room for the shortest way out of each door
+    :param layout: BoardLayout object the room belongs to
+    :param name: name of the room in the layout
+    :param direction: direction the first gremlin is going as it comes in
+    :param max_states: number of distinct states to give up after
+    :return: returns tuple (exits, complete) where exits maps door Direction enums to the shortest
+        list of Action enums going out of it and complete is True if the whole state space was
+        searched (so any missing door is proven unreachable)
+    '''
+    sim = RoomSimulation(layout, name, direction)
+    doors = sim.doors()
+    exits = {}
+
+    start = sim.key()
+    sim.remember(start[0])
+    parents = {start: None}
+    queue = deque([(start, sim.gremlins)])
+
+    while queue:
+        key, gremlins = queue.popleft()
+        if len(gremlins) == 0:
+            continue #nothing left to move
+        for action in ACTIONS:
+            sim.load(key[0], gremlins)
+            sim.act(action)
+
+            if sim.exit is not None:
+                if sim.exit not in exits:
+                    exits[sim.exit] = path_to(parents, key) + [action]
+                    if len(exits) == len(doors):
+                        return exits, True
+                continue
+
+            child = sim.key()
+            if child not in parents:
+                if len(parents) >= max_states:
+                    return exits, False
+                parents[child] = (key, action)
+                queue.append((child, sim.gremlins))
+
+    return exits, True
+
+def path_to(parents, key):
+    '''
+    Follows parent links back to the start of the search
+    :return: returns list of Action enums from the start to a state
+    '''
+    path = []
+    while parents[key] is not None:
+        key, action = parents[key]
+        path.append(action)
+    path.reverse()
+    return path
+
+def room_entries(layout):
+    '''
+    Finds every way each room can be entered
+    :param layout: BoardLayout object
+    :return: returns set of (room name, direction) tuples
+    '''
+    entries = {(layout.get_start()[0], Direction.UP)}
+    for name, doors in layout.transitions.items():
+        for direction in doors:
+            next_map = layout.next_map(name, direction)
+            if next_map is not None:
+                entries.add((next_map[0], next_map[2]))
+    return entries
+
+def solve_layout(layout, max_states=MAX_STATES):
+    '''
+    Solves every way into every room of a layout
+    :param layout: BoardLayout object or name of .layout file in the assets folder
+    :return: returns dict of (room name, direction) to solve_room results
+    '''
+    layout = layout if isinstance(layout, BoardLayout) else BoardLayout(layout)
+    return {entry: solve_room(layout, entry[0], entry[1], max_states)
+            for entry in sorted(room_entries(layout), key=lambda entry: (entry[0], entry[1]))}
+
+def par(layout, solutions):
+    '''
+    Finds the fewest actions needed to win, going through rooms as solved
+    Every room is assumed to be fresh each time it is entered, but a real game keeps the changes
+    made to a room between visits, so a path which goes back into a room may not work (see replays_to_win)
+    :param layout: BoardLayout object
+    :param solutions: dict as returned by solve_layout
+    :return: returns list of Action enums for the whole game or None if it can't be won
+    '''
+    start = (layout.get_start()[0], Direction.UP)
+    best = {start: 0}
+    heap = [(0, 0, start, [])]
+    count = 1 #tiebreaker so paths are never compared
+    while heap:
+        cost, _, entry, actions = heapq.heappop(heap)
+        if entry is None:
+            return actions
+        if cost > best.get(entry, cost):
+            continue
+        exits, _ = solutions[entry]
+        for door, path in exits.items():
+            next_map = layout.next_map(entry[0], door)
+            next_entry = None if next_map is None else (next_map[0], next_map[2])
+            next_cost = cost + len(path)
+            if next_entry is None or next_cost < best.get(next_entry, next_cost + 1):
+                if next_entry is not None:
+                    best[next_entry] = next_cost
+                heapq.heappush(heap, (next_cost, count, next_entry, actions + path))
+                count += 1
+    return None
+
+def replays_to_win(layout, actions):
+    '''
+    Checks a path found by par by playing it in a real game, where rooms keep their changes between visits
+    :param layout: BoardLayout object
+    :param actions: list of Action enums
+    :return: returns True if the game is won by the end of the actions
+    '''
+    sim = Simulation(layout)
+    for action in actions:
+        if sim.won:
+            break
+        sim.act(action)
+    return sim.won
+
+def par_report(layout, actions):
+    '''
+    Describes a path found by par, saying whether it works when rooms keep their changes
+    :param actions: list of Action enums
+    :return: returns string
+    '''
+    checked = "replays to a win" if replays_to_win(layout, actions) else "DOESN'T replay to a win in a real game"
+    return "par: %d actions (rooms assumed fresh each visit, %s)" % (len(actions), checked)
+
+def room_report(name, direction, exits, complete):
+    '''
+    Describes how a room can be left when entered one way
+    :param exits: dict of door Direction enums to lists of Action enums as found by solve_room
+    :param complete: whether the whole room was searched
+    :return: returns string
+    '''
+    found = ", ".join("%s in %d" % (door.name, len(path)) for door, path in sorted(exits.items()))
+    status = "" if complete else " (search cut off)"
+    return "%s from %s: %s%s" % (name, direction.name, found if found else "unsolvable", status)
+
+def main():
+    '''
+    Solves the layout given on the command line (max_states= sets the search limit of each room) and prints a report
+    '''
+    kwargs, args = split_args()
+    layout_file = args[0] if len(args) > 0 else "gbd1/gbd1.layout"
+    max_states = int(kwargs.get("max_states", MAX_STATES))
+    layout = BoardLayout(layout_file)
+    if not layout.completable:
+        print("layout can't be won: no rooms lead from the start to END")
+        return
+    for name in sorted(layout.dead_rooms):
+        print("%s can't lead to END" % name)
+
+    solutions = solve_layout(layout, max_states)
+    for (name, direction), (exits, complete) in solutions.items():
+        print(room_report(name, direction, exits, complete))
+
+    actions = par(layout, solutions)
+    if actions is None and all(complete for _, complete in solutions.values()):
+        print("par: layout can't be won")
+    elif actions is None:
+        print("par: no win found before the search was cut off (try a higher max_states)")
+    else:
+        print(par_report(layout, actions))
+
+if __name__ == "__main__":
+    main()
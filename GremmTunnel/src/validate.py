@@ -0,0 +1,146 @@
+'''
+Checks every layout in the assets folders in parallel, solving each room in a worker process
+Run with folders or .layout files to check only those, for example: python validate.py ../assets/gbd2 workers=4
+Compiled copies of the layouts are kept next to them to skip parsing next time (compiled=0 turns this off)
+'''
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import os
+import sys
+from os.path import join as pathjoin
+
+from gameboard import BoardLayout
+from general import PROJECT_ROOT, split_args, is_true
+import solver
+
+
+#folders searched for layouts when none are given (the DegDoc copy is a link, so it is skipped as a duplicate)
+ASSET_FOLDERS = (
+    pathjoin(PROJECT_ROOT, "assets"),
+    pathjoin(PROJECT_ROOT, "..", "DegDoc", "py_src", "assets"),
+)
+
+def find_layouts(paths):
+    '''
+    Finds every .layout file in folders (recursively), skipping files reached twice through links
+    :param paths: list of folders and .layout files
+    :return: returns list of (name to show, absolute real path) tuples
+    '''
+    layouts = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(glob.glob(pathjoin(path, "**", "*.layout"), recursive=True))
+            names = [os.path.relpath(filename, path) for filename in found]
+        else:
+            found = names = [path]
+        for name, filename in zip(names, found):
+            real = os.path.realpath(filename)
+            if real not in seen:
+                seen.add(real)
+                layouts.append((name, real))
+    return layouts
+
+def check_layout(path, compiled=True):
+    '''
+    Parses a layout and checks which rooms can be reached and lead to END
+    :param path: absolute path of .layout file
+    :param compiled: if True, saves a compiled copy of the layout so the room workers (and later runs) skip parsing
+    :return: returns dict with rooms, entries (list of (room, direction) to solve),
+        completable, unreachable and dead_rooms
+    '''
+    layout = BoardLayout(path, compiled)
+    return {
+        "rooms": len(layout.maps),
+        "entries": sorted(solver.room_entries(layout)),
+        "completable": layout.completable,
+        "unreachable": sorted(set(layout.maps) - layout.reachable),
+        "dead_rooms": sorted(layout.dead_rooms),
+    }
+
+def check_room(path, name, direction, max_states=solver.MAX_STATES, compiled=True):
+    '''
+    Solves one way into one room of a layout (the layout is loaded once per worker and cached)
+    :param compiled: if True, loads the compiled copy saved by check_layout instead of parsing
+    :return: returns solve_room result (exits, complete)
+    '''
+    return solver.solve_room(BoardLayout(path, compiled), name, direction, max_states)
+
+def validate(layouts, workers=None, max_states=solver.MAX_STATES, out=sys.stdout, compiled=True):
+    '''
+    Checks layouts in a process pool, printing each result as soon as it is ready
+    :param layouts: list of (name to show, absolute path) tuples as given by find_layouts
+    :param workers: number of processes or None for one per core
+    :param compiled: if True, keeps compiled copies of the layouts next to them (see gameboard.load_layout)
+    :return: returns number of layouts which failed (couldn't be parsed, had a room which raised or were proven unwinnable)
+    '''
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        checks = {pool.submit(check_layout, path, compiled): (name, path) for name, path in layouts}
+        rooms = {}
+        solutions = {}
+        for future in as_completed(checks):
+            name, path = checks[future]
+            try:
+                report = future.result()
+            except Exception as error:
+                failed += 1
+                print("%s: FAILED to load: %s: %s" % (name, type(error).__name__, error), file=out)
+                continue
+            print("%s: %d rooms, %s" % (name, report["rooms"], "completable" if report["completable"] else "CAN'T REACH END"), file=out)
+            for room in report["unreachable"]:
+                print("%s: %s is never reached" % (name, room), file=out)
+            for room in report["dead_rooms"]:
+                print("%s: %s can't lead to END" % (name, room), file=out)
+            if not report["completable"]:
+                failed += 1
+                continue
+            solutions[path] = {}
+            for room, direction in report["entries"]:
+                rooms[pool.submit(check_room, path, room, direction, max_states, compiled)] = (name, path, room, direction)
+
+        remaining = {path: sum(1 for entry in rooms.values() if entry[1] == path) for path in solutions}
+        broken = set() #layouts with a room which couldn't be solved
+        for future in as_completed(rooms):
+            name, path, room, direction = rooms[future]
+            remaining[path] -= 1
+            try:
+                exits, complete = solutions[path][(room, direction)] = future.result()
+            except Exception as error:
+                if path not in broken:
+                    broken.add(path)
+                    failed += 1
+                print("%s: %s from %s FAILED: %s: %s" % (name, room, direction.name, type(error).__name__, error), file=out)
+                out.flush()
+                continue
+            print("%s: %s" % (name, solver.room_report(room, direction, exits, complete)), file=out)
+            if remaining[path] == 0 and path not in broken:
+                layout = BoardLayout(path, compiled)
+                actions = solver.par(layout, solutions[path])
+                if actions is None and all(complete for _, complete in solutions[path].values()):
+                    failed += 1
+                    print("%s: par: CAN'T BE WON" % name, file=out)
+                elif actions is None:
+                    print("%s: par: no win found before the search was cut off (try a higher max_states)" % name, file=out)
+                else:
+                    print("%s: %s" % (name, solver.par_report(layout, actions)), file=out)
+            out.flush()
+    return failed
+
+def main():
+    '''
+    Validates the folders or layouts on the command line (or every asset folder) and exits 1 if any failed
+    '''
+    kwargs, paths = split_args()
+    paths = paths if len(paths) > 0 else [folder for folder in ASSET_FOLDERS if os.path.isdir(folder)]
+    workers = int(kwargs["workers"]) if "workers" in kwargs else None
+    max_states = int(kwargs.get("max_states", solver.MAX_STATES))
+    compiled = is_true(kwargs.get("compiled", True))
+
+    layouts = find_layouts(paths)
+    print("checking %d layouts" % len(layouts))
+    sys.exit(1 if validate(layouts, workers, max_states, compiled=compiled) > 0 else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+'''
+Lets the tests import the game modules from src and draw without a display
+'''
+
+import os
+import sys
+from os.path import abspath, dirname, join as pathjoin
+
+SRC = pathjoin(dirname(abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
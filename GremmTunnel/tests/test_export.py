@@ -0,0 +1,40 @@
+'''
+Tests that exported frames follow the same game as a replay
+'''
+
+import pygame
+
+import export
+import generator
+import replay
+from general import Action
+
+
+def record_session(tmp_path, layout_file, actions):
+    '''
+    Plays actions the way the engine records them and reads the log back
+    :return: returns (layout file, [(tick, room, Action)], digest) as given by replay.read_log
+    '''
+    log_file = str(tmp_path / "game.log")
+    sim = replay.new_game(layout_file)
+    recorder = replay.Recorder(log_file, layout_file)
+    for tick, action in enumerate(actions):
+        recorder.record(tick, sim.board_name, action)
+        sim.act(action)
+    recorder.close(sim)
+    return replay.read_log(log_file)[0]
+
+def test_export_replays_undo(tmp_path):
+    layout_file = generator.write_layout(str(tmp_path), "undo", rooms=3, seed=1)
+    actions = [Action.MOVE] * 6 + [Action.UNDO] * 3 + [Action.RIGHT, Action.MOVE, Action.UNDO, Action.LEFT] + [Action.MOVE] * 4
+    _, recorded, digest = record_session(tmp_path, layout_file, actions)
+
+    states = export.replay_states(layout_file, recorded)
+    expected = export.capture(replay.play(layout_file, recorded, digest))
+    assert states[-1] == expected
+
+    filenames = export.export_states(states, str(tmp_path / "frames"), workers=1)
+    assert len(filenames) == len(actions) + 1
+    last = pygame.image.load(filenames[-1])
+    renderer = export.FrameRenderer()
+    assert pygame.image.tobytes(last, "RGB") == pygame.image.tobytes(renderer.render(expected), "RGB")
@@ -0,0 +1,19 @@
+'''
+Tests that layouts load from their compiled copies and fall back to parsing when those are unusable
+'''
+
+import gameboard
+import generator
+
+
+def test_unusable_compiled_layout_is_parsed_again(tmp_path):
+    layout_file = generator.write_layout(str(tmp_path), "stale", rooms=2, seed=3)
+    with open(layout_file + gameboard.COMPILED_EXTENSION, "wb") as fp:
+        fp.write(b"cno_such_module\nGone\n.") #pickle of a class in a module which can't be imported
+    gameboard.LAYOUT_CACHE.clear()
+    parsed = gameboard.BoardLayout(layout_file, compiled=True)
+    assert len(parsed.maps) == 2
+
+    gameboard.LAYOUT_CACHE.clear()
+    loaded = gameboard.BoardLayout(layout_file, compiled=True)
+    assert loaded.maps == parsed.maps
@@ -0,0 +1,37 @@
+'''
+Tests that repainting changed tiles draws the same pixels as repainting the whole board
+'''
+
+import random
+from os.path import abspath, dirname, join as pathjoin
+
+import pygame
+
+import gui
+from gameboard import packed_board_from_file
+from general import Tile
+
+
+ASSETS = pathjoin(dirname(abspath(__file__)), "..", "assets")
+
+def full_paint(display, board):
+    '''
+    Paints a board from scratch onto a new surface
+    :return: returns bytes of the pixels
+    '''
+    background = pygame.Surface((display.max_x, display.max_y))
+    display.paint_background(background, board, background.get_rect())
+    return pygame.image.tobytes(background, "RGB")
+
+def test_partial_repaint_matches_full_repaint():
+    board = packed_board_from_file(pathjoin(ASSETS, "gbd1", "easy.map"))
+    display = gui.GameBoard(board)
+    rng = random.Random(0)
+    changes = [[(9, 4), (10, 3)]]
+    changes += [[(rng.randrange(board.width), rng.randrange(board.height)) for _ in range(2)] for _ in range(300)]
+    tiles = [Tile.EMPTY, Tile.OCCUPIED, Tile.BK_SLASH, Tile.FW_SLASH, Tile.GENERIC_ITEM]
+    for index, cells in enumerate(changes):
+        for x, y in cells:
+            board.set_tile(x, y, Tile.OCCUPIED if index == 0 else rng.choice(tiles))
+        display.update_background(board, cells)
+        assert pygame.image.tobytes(display.layers["background"], "RGB") == full_paint(display, board), cells